@@ -48,3 +48,87 @@ Notes:
     - Podeu tenir múltiples galeries actives simultàniament
     - Les operacions d'afegir/eliminar són ràpides (no busquen a la llista)
 """
+
+import json
+import os
+
+import cfg
+
+
+class Gallery:
+    """
+    Llista ordenada d'UUID d'imatges de la col·lecció.
+
+    load_file() valida les imatges amb l'ImageID de la col·lecció; sense
+    ImageID, una imatge és vàlida si l'arxiu existeix dins ROOT_DIR i el seu
+    UUID es calcula amb cfg.get_uuid(). show() necessita un ImageViewer.
+    """
+
+    def __init__(self, image_id=None, viewer=None):
+        self._image_id = image_id
+        self._viewer = viewer
+        self.name = None
+        self.description = None
+        self.created_date = None
+        self.images = []        # UUID de les imatges, en ordre
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def _uuid(self, image: str) -> str:
+        """UUID d'una imatge (path canònic) de la col·lecció, o None."""
+        if self._image_id is not None:
+            return self._image_id.get_uuid(image)
+        if image.startswith("../") or \
+                not os.path.isfile(os.path.join(cfg.ROOT_DIR, image)):
+            return None     # fora de ROOT_DIR o inexistent
+        return str(cfg.get_uuid(image))
+
+    def load_file(self, file: str) -> None:
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"ERROR llegint la galeria {file}: {e}")
+            return
+        if not isinstance(data, dict):
+            print(f"ERROR: la galeria {file} no és un objecte JSON")
+            return
+        self.name = data.get("gallery_name")
+        self.description = data.get("description")
+        self.created_date = data.get("created_date")
+        self.images = []
+        root = os.path.normpath(cfg.ROOT_DIR)
+        base = os.path.dirname(root)
+        for path in data.get("images", []):
+            if not isinstance(path, str):
+                print(f"ERROR: la imatge {path!r} no és un path")
+                continue
+            # Els paths poden incloure el directori arrel ("generated_images/...")
+            uuid = self._uuid(cfg.get_canonical_pathfile(
+                os.path.join(base, path)))
+            if uuid is None:
+                uuid = self._uuid(cfg.get_canonical_pathfile(
+                    os.path.join(root, path)))
+            if uuid is None:
+                print(f"ERROR: la imatge {path} no és a la col·lecció")
+                continue
+            self.images.append(uuid)
+
+    def show(self) -> None:
+        if self._viewer is None:
+            print("ERROR: la galeria no té cap ImageViewer per mostrar-la")
+            return
+        for uuid in self.images:
+            self._viewer.show_image(uuid)
+
+    def add_image_at_end(self, uuid: str) -> None:
+        self.images.append(uuid)
+
+    def remove_first_image(self) -> None:
+        if self.images:
+            del self.images[0]
+
+    def remove_last_image(self) -> None:
+        if self.images:
+            self.images.pop()
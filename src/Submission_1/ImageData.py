@@ -57,3 +57,422 @@ Notes:
     - Les dimensions es llegeixen amb img.width i img.height
     - Tots els camps de metadades es guarden com a strings
 """
+
+import os
+import os.path
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+import cfg
+import PngReader
+from MetadataCatalog import MetadataCatalog
+
+
+def _parse_batch(paths: list) -> list:
+    """Llegeix un lot de PNG (a nivell de mòdul perquè sigui picklable)."""
+    return [PngReader.read_png_info(path) for path in paths]
+
+
+class ImageData:
+    """
+    Metadades de les imatges de la col·lecció, indexades per UUID.
+
+    Les dades es guarden per columnes (struct-of-arrays): cada imatge té un
+    ordinal dens i cada camp és una columna indexada per ordinal. Els camps
+    categòrics (pocs valors diferents i molt repetits: model, sampler, steps,
+    cfg_scale, generated, data) es guarden com a codis enters petits dins un
+    array, amb un diccionari codi -> valor per camp. Els prompts i les
+    llavors, gairebé sempre diferents, es guarden en llistes. Els ordinals
+    de les imatges eliminades es reutilitzen.
+    """
+
+    # Camps de metadades obligatoris (noms dels chunks de text del PNG)
+    FIELDS = ("Prompt", "Model", "Seed", "CFG_Scale", "Steps",
+              "Sampler", "Generated", "Created_Date")
+
+    # Camps guardats com a codis dins un diccionari de valors
+    CATEGORICAL = ("Model", "CFG_Scale", "Steps", "Sampler", "Generated",
+                   "Created_Date")
+
+    # Valors de les columnes de dimensions
+    _NOT_LOADED = -2
+    _UNKNOWN = -1
+
+    def __init__(self, catalog_file: str = None, lazy: bool = False):
+        """
+        Si s'indica 'catalog_file', les metadades dels PNG que no han
+        canviat des de l'última execució es recuperen d'aquest catàleg
+        persistent (vegeu MetadataCatalog) envers tornar-les a llegir.
+
+        Amb lazy=True, add_image() només registra el path i el PNG es llegeix
+        la primera vegada que es consulta un camp de la imatge (get_*, o una
+        cerca de SearchMetadata). prefetch() permet escalfar-ne molts de cop.
+        """
+        self.lazy = lazy
+        self._catalog = None
+        if catalog_file is not None:
+            self._catalog = MetadataCatalog(catalog_file)
+        self._ordinals = {}     # uuid -> ordinal (en ordre d'inserció)
+        self._free = []         # ordinals lliures
+        self._files = []        # ordinal -> path relatiu a ROOT_DIR
+        self._prompts = []      # ordinal -> prompt
+        self._seeds = []        # ordinal -> seed
+        self._codes = {field: array("H") for field in self.CATEGORICAL}
+        self._values = {field: ["None"] for field in self.CATEGORICAL}
+        self._code_of = {field: {"None": 0} for field in self.CATEGORICAL}
+        self._widths = array("l")
+        self._heights = array("l")
+        self._listeners = []    # callbacks d'esdeveniments de canvi
+        self._generation = 0    # s'incrementa a cada canvi de la col·lecció
+
+    @property
+    def generation(self) -> int:
+        """Comptador de canvis: permet detectar dades derivades obsoletes."""
+        return self._generation
+
+    def subscribe(self, callback) -> None:
+        """
+        Registra un callback(event, uuid) que es crida després de cada canvi
+        de la col·lecció. Els esdeveniments són:
+            "add"    : add_image() (també si l'UUID ja existia)
+            "remove" : remove_image() d'un UUID existent
+            "load"   : load_metadata() ha substituït les metadades
+        """
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, event: str, uuid: str) -> None:
+        self._generation += 1
+        for callback in self._listeners:
+            callback(event, uuid)
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self._ordinals
+
+    def uuids(self) -> list:
+        """Retorna els UUID de la col·lecció en ordre d'inserció."""
+        return list(self._ordinals)
+
+    def iter_uuids(self, limit: int = None, offset: int = 0):
+        """
+        Itera els UUID en ordre d'inserció sense construir cap llista,
+        saltant els 'offset' primers i donant-ne com a molt 'limit'.
+        """
+        return islice(self._ordinals, offset,
+                      None if limit is None else offset + limit)
+
+    def is_loaded(self, uuid: str) -> bool:
+        """Indica si les metadades de la imatge ja s'han llegit del PNG."""
+        ordinal = self._ordinals.get(uuid)
+        return ordinal is not None and \
+            self._widths[ordinal] != self._NOT_LOADED
+
+    def _encode(self, field: str, value: str) -> int:
+        """Retorna el codi d'un valor categòric (i l'afegeix si és nou)."""
+        code_of = self._code_of[field]
+        code = code_of.get(value)
+        if code is None:
+            code = len(self._values[field])
+            self._values[field].append(value)
+            code_of[value] = code
+            codes = self._codes[field]
+            if code > 0xFFFF and codes.typecode == "H":
+                self._codes[field] = array("I", codes)
+        return code
+
+    def _store(self, ordinal: int, fields: dict, dimensions: tuple) -> None:
+        """Escriu les metadades i dimensions d'una imatge a les columnes."""
+        self._prompts[ordinal] = fields["Prompt"]
+        self._seeds[ordinal] = fields["Seed"]
+        for field in self.CATEGORICAL:
+            self._codes[field][ordinal] = self._encode(field, fields[field])
+        width, height = dimensions
+        self._widths[ordinal] = self._UNKNOWN if width is None else width
+        self._heights[ordinal] = self._UNKNOWN if height is None else height
+
+    def _reset(self, ordinal: int) -> None:
+        """Deixa una imatge sense metadades (com just després d'afegir-la)."""
+        self._prompts[ordinal] = "None"
+        self._seeds[ordinal] = "None"
+        for field in self.CATEGORICAL:
+            self._codes[field][ordinal] = 0
+        self._widths[ordinal] = self._NOT_LOADED
+        self._heights[ordinal] = self._NOT_LOADED
+
+    def add_image(self, uuid: str, file: str) -> None:
+        ordinal = self._ordinals.get(uuid)
+        if ordinal is None:
+            if self._free:
+                ordinal = self._free.pop()
+            else:
+                ordinal = len(self._files)
+                self._files.append(None)
+                self._prompts.append(None)
+                self._seeds.append(None)
+                for codes in self._codes.values():
+                    codes.append(0)
+                self._widths.append(0)
+                self._heights.append(0)
+            self._ordinals[uuid] = ordinal
+        self._files[ordinal] = file
+        self._reset(ordinal)
+        self._notify("add", uuid)
+
+    def remove_image(self, uuid: str) -> None:
+        ordinal = self._ordinals.pop(uuid, None)
+        if ordinal is None:
+            return
+        if self._catalog is not None:
+            # Si no, el catàleg conservaria tots els arxius vistos mai
+            self._catalog.discard(self._files[ordinal])
+        self._files[ordinal] = None
+        self._reset(ordinal)
+        self._free.append(ordinal)
+        self._notify("remove", uuid)
+
+    def load_metadata(self, uuid: str) -> None:
+        ordinal = self._ordinals.get(uuid)
+        if ordinal is None:
+            print(f"ERROR: UUID {uuid} inexistent")
+            return
+        result = self._read_file(self._files[ordinal])
+        if result is None:
+            result = (dict.fromkeys(self.FIELDS, "None"), (None, None))
+        self._store(ordinal, *result)
+        self._notify("load", uuid)
+
+    def _parse_file(self, path: str):
+        """
+        Llegeix metadades i dimensions d'un PNG amb una sola lectura.
+        Retorna ({camp: valor}, (width, height)) o None si hi ha error.
+        """
+        return self._from_info(PngReader.read_png_info(path))
+
+    def _from_info(self, info):
+        if info is None:
+            return None
+        metadata = info["metadata"]
+        return ({field: metadata.get(field, "None") for field in self.FIELDS},
+                (info["width"], info["height"]))
+
+    def _read_file(self, file: str):
+        """Com _parse_file(), però passant pel catàleg si n'hi ha."""
+        path = os.path.join(cfg.get_root(), file)
+        catalog = self._catalog
+        if catalog is None:
+            return self._parse_file(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return self._parse_file(path)   # mostra l'error
+        entry = catalog.get(file, stat)
+        if entry is not None:
+            return entry["metadata"], tuple(entry["dimensions"])
+        result = self._parse_file(path)
+        if result is not None:
+            catalog.put(file, stat, metadata=result[0],
+                        dimensions=list(result[1]))
+        return result
+
+    def load_all(self, uuids, workers: int = None, batch_size: int = 256,
+                 threads: bool = False) -> dict:
+        """
+        Com load_metadata() per a molts UUID alhora: els PNG es llegeixen en
+        lots de 'batch_size' arxius en un pool de 'workers' processos (o
+        fils, si threads és True). Per defecte workers = os.cpu_count();
+        amb workers=1 la lectura es fa en aquest mateix procés.
+
+        Els resultats s'incorporen en l'ordre de 'uuids', independentment
+        de l'ordre en què acabin els lots. Un error en un arxiu no atura la
+        resta: es retorna un diccionari {uuid: missatge} amb els errors (i
+        les metadades d'aquell arxiu queden a "None", com a load_metadata).
+        """
+        root = cfg.get_root()
+        catalog = self._catalog
+        uuids = list(dict.fromkeys(uuids))
+        results = {}
+        errors = {}
+        pending = []            # [(uuid, file, path, stat)] a llegir del disc
+        for uuid in uuids:
+            file = self.get_file(uuid)
+            if file is None:
+                errors[uuid] = f"UUID {uuid} inexistent"
+                continue
+            path = os.path.join(root, file)
+            stat = None
+            if catalog is not None:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    pass
+                entry = catalog.get(file, stat) if stat is not None else None
+                if entry is not None:
+                    results[uuid] = (entry["metadata"],
+                                     tuple(entry["dimensions"]))
+                    continue
+            pending.append((uuid, file, path, stat))
+
+        paths = [item[2] for item in pending]
+        batches = [paths[i:i + batch_size]
+                   for i in range(0, len(paths), batch_size)]
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or len(batches) <= 1:
+            infos = [info for batch in batches for info in _parse_batch(batch)]
+        else:
+            pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+            with pool(max_workers=min(workers, len(batches))) as executor:
+                infos = [info for batch in executor.map(_parse_batch, batches)
+                         for info in batch]
+
+        for (uuid, file, path, stat), info in zip(pending, infos):
+            result = self._from_info(info)
+            if result is None:
+                errors[uuid] = f"No s'han pogut llegir les metadades de {file}"
+                continue
+            if catalog is not None and stat is not None:
+                catalog.put(file, stat, metadata=result[0],
+                            dimensions=list(result[1]))
+            results[uuid] = result
+
+        for uuid in uuids:
+            ordinal = self._ordinals.get(uuid)
+            if ordinal is None:
+                continue
+            result = results.get(uuid)
+            if result is None:
+                result = (dict.fromkeys(self.FIELDS, "None"), (None, None))
+            self._store(ordinal, *result)
+            self._notify("load", uuid)
+        return errors
+
+    def prefetch(self, uuids=None, **options) -> dict:
+        """
+        Llegeix (amb load_all) les metadades de les imatges de 'uuids' que
+        encara no estan carregades; per defecte, de tota la col·lecció. Les
+        opcions es passen a load_all(). Retorna el diccionari d'errors.
+        """
+        if uuids is None:
+            uuids = self._ordinals
+        pending = [uuid for uuid in uuids
+                   if uuid in self._ordinals and not self.is_loaded(uuid)]
+        if not pending:
+            return {}
+        return self.load_all(pending, **options)
+
+    def save_catalog(self) -> None:
+        """Desa (atòmicament) el catàleg persistent, si n'hi ha."""
+        if self._catalog is not None:
+            self._catalog.save()
+
+    def get_file(self, uuid: str) -> str:
+        """Retorna el path relatiu de l'arxiu de la imatge (o None)."""
+        ordinal = self._ordinals.get(uuid)
+        return None if ordinal is None else self._files[ordinal]
+
+    def get_field(self, uuid: str, field: str) -> str:
+        """Retorna el valor d'un camp de metadades ("None" si no hi és)."""
+        ordinal = self._ordinals.get(uuid)
+        if ordinal is None:
+            return "None"
+        if self.lazy and self._widths[ordinal] == self._NOT_LOADED:
+            self.load_metadata(uuid)
+        if field == "Prompt":
+            return self._prompts[ordinal]
+        if field == "Seed":
+            return self._seeds[ordinal]
+        codes = self._codes.get(field)
+        if codes is None:
+            return "None"
+        return self._values[field][codes[ordinal]]
+
+    def get_prompt(self, uuid: str) -> str:
+        return self.get_field(uuid, "Prompt")
+
+    def get_model(self, uuid: str) -> str:
+        return self.get_field(uuid, "Model")
+
+    def get_seed(self, uuid: str) -> str:
+        return self.get_field(uuid, "Seed")
+
+    def get_cfg_scale(self, uuid: str) -> str:
+        return self.get_field(uuid, "CFG_Scale")
+
+    def get_steps(self, uuid: str) -> str:
+        return self.get_field(uuid, "Steps")
+
+    def get_sampler(self, uuid: str) -> str:
+        return self.get_field(uuid, "Sampler")
+
+    def get_generated(self, uuid: str) -> str:
+        return self.get_field(uuid, "Generated")
+
+    def get_created_date(self, uuid: str) -> str:
+        return self.get_field(uuid, "Created_Date")
+
+    def get_dimensions(self, uuid: str) -> tuple:
+        """
+        Retorna (width, height). Si les metadades ja s'han carregat, les
+        dimensions es llegeixen de memòria sense accedir al disc.
+        """
+        ordinal = self._ordinals.get(uuid)
+        if ordinal is None:
+            return (None, None)
+        if self.lazy and self._widths[ordinal] == self._NOT_LOADED:
+            self.load_metadata(uuid)
+        width, height = self._widths[ordinal], self._heights[ordinal]
+        if width == self._NOT_LOADED:
+            file = self._files[ordinal]
+            return cfg.get_png_dimensions(os.path.join(cfg.get_root(), file))
+        return (None if width == self._UNKNOWN else width,
+                None if height == self._UNKNOWN else height)
+
+    def memory_report(self) -> dict:
+        """
+        Estima la memòria (bytes) ocupada per cada estructura interna, el
+        total i la mitjana per imatge. Els strings compartits (p.ex. el
+        mateix "None") només es compten una vegada.
+
+        Només inclou les columns d'ImageData: la memòria dels índexs de
+        cerca (trigrames, valors, columnes ordenades i cache) la reporta
+        SearchMetadata.memory_report().
+        """
+        seen = set()
+
+        def strings(items) -> int:
+            size = 0
+            for item in items:
+                if item is not None and id(item) not in seen:
+                    seen.add(id(item))
+                    size += sys.getsizeof(item)
+            return size
+
+        def column(items: list) -> int:
+            return sys.getsizeof(items) + strings(items)
+
+        report = {
+            "uuids": sys.getsizeof(self._ordinals)
+                     + strings(self._ordinals)
+                     + strings(self._ordinals.values()),
+            "files": column(self._files),
+            "prompts": column(self._prompts),
+            "seeds": column(self._seeds),
+            "categorical": sum(sys.getsizeof(self._codes[field])
+                               + column(self._values[field])
+                               + sys.getsizeof(self._code_of[field])
+                               for field in self.CATEGORICAL),
+            "dimensions": sys.getsizeof(self._widths)
+                          + sys.getsizeof(self._heights),
+        }
+        total = sum(report.values())
+        report["total"] = total
+        report["per_image"] = total / len(self) if len(self) else 0.0
+        return report
@@ -27,3 +27,176 @@ Notes:
     - Només considereu arxius amb extensió .png (case-insensitive)
     - Heu de recórrer tots els subdirectoris recursivament
 """
+
+import os
+import time
+from itertools import islice
+
+import cfg
+
+
+class ImageFiles:
+    """
+    Llistat en memòria dels arxius PNG de la col·lecció.
+
+    Per no haver de recórrer tot l'arbre a cada reload_fs(), es guarda per a
+    cada directori el seu mtime i el llistat de l'última lectura. El mtime
+    d'un directori només canvia quan s'hi afegeixen, eliminen o reanomenen
+    entrades, de forma que si és el mateix es reutilitza el llistat guardat
+    (només cal un stat per directori). Els directoris que han canviat es
+    tornen a llegir amb os.scandir(), que ja indica el tipus de cada entrada.
+
+    Mode de seguiment de canvis (poll/watch): a més del llistat, es guarda un
+    segell (mida, mtime_ns, inode) de cada arxiu, de forma que també es
+    detecten els arxius modificats (p.ex. un PNG sobreescrit amb noves
+    metadades). Els consumidors es registren amb subscribe():
+
+        def on_file(event, file):
+            if event == "added":
+                uuid = image_id.generate_uuid(file)
+                image_data.add_image(uuid, file)
+                image_data.load_metadata(uuid)
+            elif event == "modified":
+                image_data.load_metadata(image_id.get_uuid(file))
+            elif event == "removed":
+                uuid = image_id.get_uuid(file)
+                image_data.remove_image(uuid)
+                image_id.remove_uuid(uuid)
+
+        image_files.subscribe(on_file)
+        image_files.watch(cfg.ROOT_DIR, interval=5.0)
+    """
+
+    # Un directori modificat fa menys d'aquest temps no es guarda al cache:
+    # un canvi posterior dins el mateix tick de mtime passaria desapercebut.
+    _RACY_NS = 2 * 10**9
+
+    def __init__(self):
+        self._files = set()     # paths relatius dels PNG presents
+        self._dirs = {}         # directori -> (mtime_ns, [PNG], [subdirectoris])
+        self._added = []
+        self._removed = []
+        self._stamps = {}       # path relatiu -> (mida, mtime_ns, inode)
+        self._listeners = []    # callbacks d'esdeveniments de poll()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def reload_fs(self, path: str) -> None:
+        scan_start = time.time_ns()
+        files = set()
+        dirs = {}
+        stack = [os.path.normpath(path)]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            cached = self._dirs.get(directory)
+            if cached is not None and cached[0] == mtime:
+                pngs, subdirs = cached[1], cached[2]
+            else:
+                listing = self._scan_dir(directory)
+                if listing is None:
+                    continue
+                pngs, subdirs = listing
+            if mtime < scan_start - self._RACY_NS:
+                dirs[directory] = (mtime, pngs, subdirs)
+            files.update(pngs)
+            stack.extend(subdirs)
+
+        self._added = sorted(files - self._files)
+        self._removed = sorted(self._files - files)
+        self._files = files
+        self._dirs = dirs
+
+    @staticmethod
+    def _scan_dir(directory: str):
+        """Retorna ([PNG canònics], [subdirectoris]) o None si hi ha error."""
+        prefix = cfg.get_canonical_pathfile(directory)
+        prefix = "" if prefix == "." else prefix + "/"
+        pngs = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(".png") \
+                            and not entry.is_dir():
+                        pngs.append(prefix + entry.name)
+        except OSError:
+            return None
+        return pngs, subdirs
+
+    def subscribe(self, callback) -> None:
+        """
+        Registra un callback(event, file) per als canvis detectats per
+        poll(). Els esdeveniments són "added", "removed" i "modified".
+        """
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def poll(self, path: str) -> list:
+        """
+        Rellegeix el directori i retorna (i notifica als subscriptors) la
+        llista d'esdeveniments (event, file) des de l'últim poll(): primer
+        els "removed", després els "added" i finalment els "modified".
+        Detectar modificacions requereix un stat per arxiu.
+        """
+        self.reload_fs(path)
+        root = cfg.get_root()
+        old = self._stamps
+        stamps = {}
+        for file in self._files:
+            try:
+                st = os.stat(os.path.join(root, file))
+            except OSError:
+                continue        # eliminat entre el llistat i el stat
+            stamps[file] = (st.st_size, st.st_mtime_ns, st.st_ino)
+
+        current = stamps.keys()
+        events = [("removed", file) for file in sorted(old.keys() - current)]
+        events += [("added", file) for file in sorted(current - old.keys())]
+        events += [("modified", file) for file in sorted(current & old.keys())
+                   if stamps[file] != old[file]]
+        self._stamps = stamps
+        for event, file in events:
+            for callback in self._listeners:
+                callback(event, file)
+        return events
+
+    def watch(self, path: str, interval: float = 1.0, stop=None) -> None:
+        """
+        Crida poll() cada 'interval' segons. Si s'indica 'stop' (un
+        threading.Event), el bucle acaba quan s'activa; si no, no acaba mai.
+        """
+        while stop is None or not stop.is_set():
+            self.poll(path)
+            if stop is None:
+                time.sleep(interval)
+            else:
+                stop.wait(interval)
+
+    def files_added(self) -> list:
+        return list(self._added)
+
+    def files_removed(self) -> list:
+        return list(self._removed)
+
+    def files_added_iter(self, limit: int = None, offset: int = 0):
+        """
+        Com files_added(), però retorna un iterador (sense copiar la llista)
+        que salta els 'offset' primers arxius i en dona com a molt 'limit'.
+        """
+        return islice(self._added, offset,
+                      None if limit is None else offset + limit)
+
+    def files_removed_iter(self, limit: int = None, offset: int = 0):
+        """Com files_added_iter(), per als arxius eliminats."""
+        return islice(self._removed, offset,
+                      None if limit is None else offset + limit)
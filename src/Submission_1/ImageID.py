@@ -31,3 +31,133 @@ Notes:
     - Els UUID s'emmagatzemen com a strings
     - Un UUID només es pot generar una vegada (fins que s'elimini)
 """
+
+import hashlib
+import uuid as uuidlib
+
+import cfg
+
+
+_NAMESPACE = uuidlib.NAMESPACE_URL.bytes
+
+
+def _uuid_key(file: str) -> int:
+    """
+    Calcula directament amb hashlib l'uuid5 de cfg.get_uuid(file) i el
+    retorna com un enter de 128 bits (sense crear cap objecte UUID).
+    """
+    key = int.from_bytes(
+        hashlib.sha1(_NAMESPACE + file.encode("utf-8")).digest()[:16], "big")
+    key &= ~(0xc000 << 48)      # variant RFC 4122
+    key |= 0x8000 << 48
+    key &= ~(0xf000 << 64)      # versió 5
+    key |= 5 << 76
+    return key
+
+
+def _parse_uuid(uuid: str):
+    """Enter de 128 bits d'un UUID en format string, o None si no ho és."""
+    if not isinstance(uuid, str):
+        return None
+    try:
+        return uuidlib.UUID(uuid).int
+    except ValueError:
+        return None
+
+
+def _format_uuid(key: int) -> str:
+    """Format estàndard (36 caràcters) d'un UUID de 128 bits."""
+    h = f"{key:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+class _FileToUUID:
+    """Vista de només lectura path -> UUID (string) sobre un ImageID."""
+
+    def __init__(self, image_id):
+        self._image_id = image_id
+
+    def __len__(self) -> int:
+        return len(self._image_id)
+
+    def __iter__(self):
+        return iter(self._image_id._files.values())
+
+    def __contains__(self, file: str) -> bool:
+        return self._image_id.get_uuid(file) is not None
+
+    def __getitem__(self, file: str) -> str:
+        uuid = self._image_id.get_uuid(file)
+        if uuid is None:
+            raise KeyError(file)
+        return uuid
+
+    def get(self, file: str, default=None):
+        uuid = self._image_id.get_uuid(file)
+        return default if uuid is None else uuid
+
+
+class ImageID:
+    """
+    Registre dels UUID actius de la col·lecció.
+
+    Per ocupar poca memòria amb milions d'imatges, els UUID es guarden com a
+    enters de 128 bits en un únic diccionari UUID -> path, envers dos
+    diccionaris d'strings de 36 caràcters: cada clau és un objecte int de 44
+    bytes en lloc d'un string de 85. La direcció path -> UUID no necessita
+    cap estructura: l'UUID és l'uuid5 del path, i per tant es recalcula i es
+    comprova que estigui registrat per a aquell mateix path.
+    Cada path només es guarda una vegada. L'API pública continua treballant
+    amb UUID en format string.
+    """
+
+    def __init__(self):
+        self._files = {}                # UUID (int de 128 bits) -> path
+        self._file_to_uuid = _FileToUUID(self)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def generate_uuid(self, file: str) -> str:
+        key = cfg.get_uuid(file).int
+        if key in self._files:
+            print(f"ERROR: UUID {_format_uuid(key)} ja en ús ({file})")
+            return None
+        self._files[key] = file
+        return _format_uuid(key)
+
+    def generate_uuids(self, files) -> list:
+        """
+        Com generate_uuid() per a molts arxius en una sola passada: calcula
+        els uuid5 directament amb hashlib (mateix resultat que
+        cfg.get_uuid()) i comprova les col·lisions contra el registre i dins
+        el mateix lot. Retorna la llista d'UUID (None si hi ha col·lisió).
+        """
+        registry = self._files
+        result = []
+        for file in files:
+            key = _uuid_key(file)
+            if key in registry:
+                print(f"ERROR: UUID {_format_uuid(key)} ja en ús ({file})")
+                result.append(None)
+                continue
+            registry[key] = file
+            result.append(_format_uuid(key))
+        return result
+
+    def get_uuid(self, file: str) -> str:
+        key = _uuid_key(file)
+        if self._files.get(key) != file:
+            return None
+        return _format_uuid(key)
+
+    def get_file(self, uuid: str) -> str:
+        """
+        Retorna el path associat a un UUID, o None si no existeix o no és
+        un UUID vàlid (p.ex. None).
+        """
+        return self._files.get(_parse_uuid(uuid))
+
+    def remove_uuid(self, uuid: str) -> None:
+        """Elimina un UUID; no fa res si no existeix o no és vàlid."""
+        self._files.pop(_parse_uuid(uuid), None)
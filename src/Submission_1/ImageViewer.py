@@ -44,3 +44,65 @@ Notes:
     - Gestioneu les excepcions si la imatge no es pot mostrar
     - El format de sortida ha de ser llegible i ben organitzat
 """
+
+import os.path
+
+import cfg
+
+
+class ImageViewer:
+    """Visualització de les imatges i de les seves metadades."""
+
+    def __init__(self, image_data):
+        self._image_data = image_data
+
+    def print_image(self, uuid: str) -> None:
+        """
+        Imprimeix les metadades de la imatge. Totes les dades (dimensions
+        incloses) es consulten a ImageData, sense accedir al disc.
+        """
+        data = self._image_data
+        file = data.get_file(uuid)
+        if file is None:
+            print(f"ERROR: UUID {uuid} inexistent")
+            return
+        width, height = data.get_dimensions(uuid)
+        prompt = data.get_prompt(uuid)
+        print("Visualitzant [{}]".format(file))
+        print(" Dimensions: {}x{} pixels".format(width, height))
+        print(" Prompt:     {}".format(prompt[:100] + "..." if len(prompt) > 100 else prompt))
+        print(" Model:      {}".format(data.get_model(uuid)))
+        print(" Seed:       {}".format(data.get_seed(uuid)))
+        print(" CFG Scale:  {}".format(data.get_cfg_scale(uuid)))
+        print(" Steps:      {}".format(data.get_steps(uuid)))
+        print(" Sampler:    {}".format(data.get_sampler(uuid)))
+        print(" Generated:  {}".format(data.get_generated(uuid)))
+        print(" Created:    {}".format(data.get_created_date(uuid)))
+        print(" UUID:       {}".format(uuid))
+        print(" Arxiu:      {}".format(file))
+
+    def show_file(self, file: str) -> None:
+        """Mostra la imatge amb PIL sense esperar que es tanqui."""
+        try:
+            from PIL import Image      # $ pip install pillow
+            img = Image.open(os.path.join(cfg.get_root(), file))
+            img.show()
+        except Exception as e:
+            print(f"No es pot mostrar la imatge: {e}")
+
+    def show_image(self, uuid: str, mode: int = None) -> None:
+        """
+        Mostra la imatge segons 'mode' (per defecte cfg.DISPLAY_MODE):
+        0 només metadades, 1 metadades + imatge, 2 només imatge.
+        """
+        if mode is None:
+            mode = cfg.DISPLAY_MODE
+        if mode < 2:
+            self.print_image(uuid)
+        if mode > 0:
+            file = self._image_data.get_file(uuid)
+            if file is None:
+                return
+            self.show_file(file)
+            print("Imatge mostrada. Premi Enter per continuar...")
+            input()
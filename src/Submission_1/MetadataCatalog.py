@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+MetadataCatalog.py : Catàleg persistent de metadades PNG entre execucions.
+
+Llegir les metadades de tots els PNG a cada arrencada és car. El catàleg és
+un arxiu JSON (sidecar) que guarda, per a cada arxiu identificat pel seu
+path canònic, les metadades ja llegides i el segell de validesa
+(mida, mtime_ns) de l'arxiu en el moment de llegir-les:
+
+{
+  "version": 2,
+  "files": {
+    "subdir/image_001.png": {"size": 123456, "mtime_ns": 1727...,
+                             "metadata": {"Prompt": "...", ...},
+                             "dimensions": [512, 512]},
+    ...
+  }
+}
+
+Si la mida o el mtime_ns actuals d'un arxiu no coincideixen amb els del
+catàleg, l'entrada es considera obsoleta i cal tornar a llegir el PNG.
+L'arxiu es reescriu de forma atòmica (arxiu temporal + os.replace), de
+forma que una interrupció no pot deixar mai un catàleg a mitges.
+"""
+
+import json
+import os
+import tempfile
+
+
+class MetadataCatalog:
+    """Catàleg path -> (mida, mtime_ns, metadades) guardat en JSON."""
+
+    VERSION = 2
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries = {}
+        self._dirty = False
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self) -> None:
+        """Llegeix el catàleg del disc (si no existeix o és invàlid, buit)."""
+        self._entries = {}
+        self._dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"ERROR llegint el catàleg {self.path}: {e}")
+            return
+        if data.get("version") == self.VERSION:
+            self._entries = data.get("files", {})
+
+    def get(self, file: str, stat: os.stat_result):
+        """
+        Retorna l'entrada guardada per a 'file' si el segell (mida,
+        mtime_ns) coincideix amb 'stat'; si no, retorna None.
+        """
+        entry = self._entries.get(file)
+        if entry is None or entry["size"] != stat.st_size \
+                or entry["mtime_ns"] != stat.st_mtime_ns:
+            return None
+        return entry
+
+    def put(self, file: str, stat: os.stat_result, **values) -> None:
+        """Guarda (o substitueix) l'entrada de 'file' amb el seu segell."""
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        entry.update(values)
+        self._entries[file] = entry
+        self._dirty = True
+
+    def discard(self, file: str) -> None:
+        """Esborra l'entrada de 'file' (p.ex. quan surt de la col·lecció)."""
+        if self._entries.pop(file, None) is not None:
+            self._dirty = True
+
+    def save(self) -> None:
+        """Reescriu el catàleg de forma atòmica si hi ha hagut canvis."""
+        if not self._dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix=".catalog-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "files": self._entries},
+                          f, ensure_ascii=False, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._dirty = False
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+PngReader.py : Lectura ràpida de metadades PNG
+
+Versió de cfg.read_png_metadata() que no llegeix les dades de la imatge i
+que, amb la mateixa lectura, obté les dimensions (read_png_info()):
+de cada chunk només es llegeix la capçalera (8 bytes), i les dades dels
+chunks que no són de text (p.ex. els IDAT amb els píxels) se salten amb
+seek(). El cost de llegir les metadades deixa de dependre de la mida de la
+imatge. El resultat és el mateix que el de cfg.read_png_metadata().
+
+cfg.py és el mòdul d'eines de la pràctica i no es modifica: aquest mòdul
+només en llegeix la configuració (PNG_TEXT_BEFORE_IDAT).
+"""
+
+import os
+
+import cfg
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+TEXT_CHUNKS = (b'tEXt', b'iTXt')
+
+
+def _parse_text_chunk(chunk_type: bytes, chunk_data: bytes,
+                      metadata: dict) -> None:
+    """Afegeix a 'metadata' el contingut d'un chunk tEXt o iTXt."""
+    if chunk_type == b'tEXt':
+        # Format: keyword\0text
+        try:
+            null_pos = chunk_data.index(b'\x00')
+            keyword = chunk_data[:null_pos].decode('latin-1')
+            text = chunk_data[null_pos + 1:].decode('latin-1')
+            metadata[keyword] = text
+        except (ValueError, UnicodeDecodeError):
+            # Si hi ha error, ignorem aquest chunk
+            pass
+
+    elif chunk_type == b'iTXt':
+        # Format: keyword\0compression_flag\0compression_method\0language\0translated_keyword\0text
+        try:
+            null_pos = chunk_data.index(b'\x00')
+            keyword = chunk_data[:null_pos].decode('latin-1')
+            rest = chunk_data[null_pos + 1:]
+
+            # Saltem compression flag (1 byte) i compression method (1 byte)
+            if len(rest) >= 2:
+                compression_flag = rest[0]
+                rest = rest[2:]
+
+                # Saltem language tag (fins al següent \0)
+                if b'\x00' in rest:
+                    null_pos = rest.index(b'\x00')
+                    rest = rest[null_pos + 1:]
+
+                    # Saltem translated keyword (fins al següent \0)
+                    if b'\x00' in rest:
+                        null_pos = rest.index(b'\x00')
+                        text_data = rest[null_pos + 1:]
+
+                        # Si està comprimit, no el processem (necessitaria zlib)
+                        if compression_flag == 0:
+                            text = text_data.decode('utf-8', errors='ignore')
+                            metadata[keyword] = text
+        except (ValueError, UnicodeDecodeError):
+            # Si hi ha error, ignorem aquest chunk
+            pass
+
+
+def read_png_info(filename: str, stop_at_idat: bool = None) -> dict:
+    """
+    Llegeix en una sola passada les dimensions (chunk IHDR), les metadades
+    de text (chunks tEXt i iTXt) i estadístiques bàsiques dels chunks d'un
+    arxiu PNG.
+
+    Només es llegeixen les dades dels chunks IHDR i de text: la resta de
+    chunks (p.ex. els IDAT amb els píxels) se salten amb seek() llegint només
+    la seva capçalera, de forma que el cost no depèn de la mida de la imatge.
+
+    Args:
+        filename (str): Path a l'arxiu PNG
+        stop_at_idat (bool): Atura la lectura en el primer chunk IDAT. Només
+              és correcte si els chunks de text van abans de les dades de
+              la imatge. Per defecte (None) s'utilitza
+              cfg.PNG_TEXT_BEFORE_IDAT.
+
+    Returns:
+        dict: {"width": int, "height": int, "metadata": dict,
+               "chunks": {tipus: nombre de chunks}, "idat_bytes": int}
+              Les dimensions són None si el primer chunk no és IHDR.
+              Si hi ha error, retorna None.
+    """
+    metadata = {}
+    chunks = {}
+    info = {"width": None, "height": None, "metadata": metadata,
+            "chunks": chunks, "idat_bytes": 0}
+    if stop_at_idat is None:
+        stop_at_idat = cfg.PNG_TEXT_BEFORE_IDAT
+
+    try:
+        with open(filename, 'rb') as f:
+            # Verificar signatura PNG
+            signature = f.read(8)
+            if signature != PNG_SIGNATURE:
+                print(f"ERROR: {filename} no és un PNG vàlid")
+                return None
+
+            # Llegir chunks
+            while True:
+                # Llegir capçalera: length (4 bytes, big-endian) + tipus (4 bytes)
+                header = f.read(8)
+                if len(header) < 8:
+                    break  # EOF
+
+                length = int.from_bytes(header[:4], byteorder='big')
+                chunk_type = header[4:]
+                name = chunk_type.decode('ascii', errors='replace')
+                chunks[name] = chunks.get(name, 0) + 1
+
+                if chunk_type == b'IDAT':
+                    if stop_at_idat:
+                        break
+                    info["idat_bytes"] += length
+
+                # El primer chunk ha de ser IHDR: width (4), height (4), ...
+                if chunk_type == b'IHDR' and f.tell() == 16 and length >= 8:
+                    ihdr_data = f.read(8)
+                    if len(ihdr_data) < 8:
+                        break
+                    info["width"] = int.from_bytes(ihdr_data[0:4], byteorder='big')
+                    info["height"] = int.from_bytes(ihdr_data[4:8], byteorder='big')
+                    f.seek(length - 8 + 4, os.SEEK_CUR)
+                    continue
+
+                if chunk_type not in TEXT_CHUNKS:
+                    # Si trobem IEND, hem acabat
+                    if chunk_type == b'IEND':
+                        break
+                    # Saltar dades + CRC (4 bytes) sense llegir-les
+                    f.seek(length + 4, os.SEEK_CUR)
+                    continue
+
+                # Llegir dades del chunk
+                chunk_data = f.read(length)
+                if len(chunk_data) < length:
+                    break  # EOF inesperat
+
+                # Llegir CRC (4 bytes) - no el validem però l'hem de saltar
+                crc = f.read(4)
+                if len(crc) < 4:
+                    break
+
+                # Processar chunks de text
+                _parse_text_chunk(chunk_type, chunk_data, metadata)
+
+        return info
+
+    except FileNotFoundError:
+        print(f"ERROR: Arxiu {filename} no trobat")
+        return None
+    except IOError as e:
+        print(f"ERROR llegint {filename}: {e}")
+        return None
+    except Exception as e:
+        print(f"ERROR inesperat processant {filename}: {e}")
+        return None
+
+
+def read_png_metadata(filename: str, stop_at_idat: bool = None) -> dict:
+    """
+    Llegeix les metadades embegudes en un arxiu PNG.
+
+    Suporta chunks tEXt i iTXt (Unicode). Vegeu read_png_info() per obtenir
+    també les dimensions amb la mateixa lectura.
+
+    Args:
+        filename (str): Path a l'arxiu PNG
+        stop_at_idat (bool): Vegeu read_png_info().
+
+    Returns:
+        dict: Diccionari amb les metadades. Retorna {} si no n'hi ha.
+              Si hi ha error, retorna None.
+    """
+    info = read_png_info(filename, stop_at_idat)
+    if info is None:
+        return None
+    return info["metadata"]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+QueryCache.py : Cache LRU de resultats de cerques amb invalidació per generació.
+
+Cada entrada guarda el resultat juntament amb la generació d'ImageData en què
+es va calcular. ImageData incrementa la generació a cada canvi de la
+col·lecció, de forma que una entrada d'una generació anterior es considera
+un fallada (i es descarta): el cache no pot retornar mai resultats obsolets.
+
+La mida està acotada pel nombre d'entrades (maxsize) i per la suma de les
+longituds dels resultats guardats (maxitems): quan se supera algun dels dos
+límits, s'expulsa l'entrada utilitzada fa més temps (Least Recently Used).
+Un resultat més llarg que maxitems no es guarda, perquè expulsaria tot el
+cache (p.ex. una cerca que retorna tota la col·lecció).
+"""
+
+import sys
+from collections import OrderedDict
+
+
+class QueryCache:
+    """Cache LRU acotat amb comptadors d'encerts, fallades i expulsions."""
+
+    def __init__(self, maxsize: int = 256, maxitems: int = 1 << 20):
+        self.maxsize = maxsize
+        self.maxitems = maxitems
+        self._entries = OrderedDict()   # clau -> (generació, resultat)
+        self._items = 0                 # suma de len(resultat)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes de les entrades i dels contenidors dels resultats."""
+        getsizeof = sys.getsizeof
+        return getsizeof(self._entries) + sum(
+            getsizeof(entry) + getsizeof(entry[1])
+            for entry in self._entries.values())
+
+    def get(self, key, generation: int):
+        """Retorna el resultat guardat per 'key', o None si no és vàlid."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != generation:
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _discard(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._items -= len(entry[1])
+
+    def put(self, key, generation: int, result) -> None:
+        self._discard(key)
+        if self.maxsize <= 0 or len(result) > self.maxitems:
+            return
+        self._entries[key] = (generation, result)
+        self._items += len(result)
+        while len(self._entries) > self.maxsize or \
+                self._items > self.maxitems:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._items -= len(evicted)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._items = 0
+
+    def info(self) -> dict:
+        """Retorna els comptadors del cache per a monitorització."""
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self._entries),
+                "maxsize": self.maxsize, "items": self._items,
+                "maxitems": self.maxitems}
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+QueryPlanner.py : Llenguatge d'expressions de cerca i planificador per
+                  selectivitat per a SearchMetadata.
+
+Sintaxi de les expressions (precedència NOT > AND > OR):
+
+    prompt:"cyberpunk city" AND model:SD2 AND NOT sampler:Euler
+    (model:SD2 OR model:Flux) AND steps:50
+
+    expressió := terme | NOT expressió | expressió AND expressió
+               | expressió OR expressió | ( expressió )
+    terme     := camp:valor | camp:"valor amb espais"
+
+Els camps són els noms dels mètodes de cerca de SearchMetadata (prompt,
+model, seed, cfg_scale, steps, sampler, date) i cada terme té la mateixa
+semàntica que el mètode corresponent (subcadena, case-sensitive).
+
+Planificació d'un AND: s'estima la mida del resultat de cada branca amb les
+estadístiques dels índexs (postings de trigrames, postings dels valors
+diferents) i s'avalua primer la branca més selectiva. La resta de branques
+només es verifiquen sobre els candidats supervivents, excepte si avaluar-les
+amb l'índex és més barat que verificar tots els candidats.
+"""
+
+import re
+
+
+_TOKEN = re.compile(r"""\s*(?:
+      (?P<lpar>\()
+    | (?P<rpar>\))
+    | (?P<op>AND|OR|NOT)(?=[\s()]|$)
+    | (?P<field>\w+):(?:"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<word>[^\s()"]*))
+    )""", re.VERBOSE)
+
+
+class _Term:
+    """Fulla de l'expressió: cerca de subcadena en un camp."""
+
+    def __init__(self, field: str, sub: str):
+        self.field = field
+        self.sub = sub
+
+    def plan(self, searcher) -> None:
+        self.estimate, self.cost = searcher._statistics(self.field, self.sub)
+
+    def evaluate(self, searcher) -> set:
+        return set(searcher._search(self.field, self.sub))
+
+    def matches(self, searcher, ordinal: int) -> bool:
+        return searcher._value(ordinal, self.field).find(self.sub) != -1
+
+
+class _Not:
+    def __init__(self, child):
+        self.child = child
+
+    def plan(self, searcher) -> None:
+        self.child.plan(searcher)
+        total = searcher._size()
+        self.estimate = total - self.child.estimate
+        self.cost = self.child.cost + total
+
+    def evaluate(self, searcher) -> set:
+        return searcher._ordinals() - self.child.evaluate(searcher)
+
+    def matches(self, searcher, ordinal: int) -> bool:
+        return not self.child.matches(searcher, ordinal)
+
+
+class _Or:
+    def __init__(self, children: list):
+        self.children = children
+
+    def plan(self, searcher) -> None:
+        for child in self.children:
+            child.plan(searcher)
+        self.estimate = min(searcher._size(),
+                            sum(child.estimate for child in self.children))
+        self.cost = sum(child.cost for child in self.children)
+
+    def evaluate(self, searcher) -> set:
+        return set().union(*(child.evaluate(searcher)
+                             for child in self.children))
+
+    def matches(self, searcher, ordinal: int) -> bool:
+        return any(child.matches(searcher, ordinal)
+                   for child in self.children)
+
+
+class _And:
+    def __init__(self, children: list):
+        self.children = children
+
+    def plan(self, searcher) -> None:
+        for child in self.children:
+            child.plan(searcher)
+        # Branques més selectives primer; els NOT al final (poc selectius)
+        self.children.sort(key=lambda child: (isinstance(child, _Not),
+                                              child.estimate, child.cost))
+        self.estimate = min(child.estimate for child in self.children)
+        self.cost = self.children[0].cost + self.estimate * \
+            (len(self.children) - 1)
+
+    def evaluate(self, searcher) -> set:
+        first, rest = self.children[0], self.children[1:]
+        candidates = first.evaluate(searcher)
+        for child in rest:
+            if not candidates:
+                break
+            if child.cost < len(candidates):
+                candidates &= child.evaluate(searcher)
+            else:
+                candidates = {ordinal for ordinal in candidates
+                              if child.matches(searcher, ordinal)}
+        return candidates
+
+    def matches(self, searcher, ordinal: int) -> bool:
+        return all(child.matches(searcher, ordinal)
+                   for child in self.children)
+
+
+class QueryPlanner:
+    """Analitza una expressió de cerca i l'avalua sobre un SearchMetadata."""
+
+    def __init__(self, searcher):
+        self._searcher = searcher
+
+    @staticmethod
+    def _tokenize(expression: str) -> list:
+        tokens = []
+        pos = 0
+        expression = expression.rstrip()
+        while pos < len(expression):
+            match = _TOKEN.match(expression, pos)
+            if match is None or match.end() == pos:
+                raise ValueError(f"Expressió de cerca invàlida a la posició "
+                                 f"{pos}: {expression[pos:]!r}")
+            pos = match.end()
+            if match.group("lpar"):
+                tokens.append(("(", None))
+            elif match.group("rpar"):
+                tokens.append((")", None))
+            elif match.group("op"):
+                tokens.append((match.group("op"), None))
+            else:
+                value = match.group("quoted")
+                if value is None:
+                    value = match.group("word")
+                else:
+                    value = re.sub(r"\\(.)", r"\1", value)
+                tokens.append(("TERM", (match.group("field"), value)))
+        return tokens
+
+    @classmethod
+    def normalize(cls, expression: str) -> tuple:
+        """Forma normalitzada (independent dels espais) d'una expressió."""
+        return tuple(cls._tokenize(expression))
+
+    def parse(self, expression: str):
+        """Retorna l'arbre de l'expressió. Llança ValueError si és invàlida."""
+        tokens = self._tokenize(expression)
+        pos = 0
+
+        def peek():
+            return tokens[pos][0] if pos < len(tokens) else None
+
+        def parse_or():
+            nonlocal pos
+            children = [parse_and()]
+            while peek() == "OR":
+                pos += 1
+                children.append(parse_and())
+            return children[0] if len(children) == 1 else _Or(children)
+
+        def parse_and():
+            nonlocal pos
+            children = [parse_not()]
+            while peek() == "AND":
+                pos += 1
+                children.append(parse_not())
+            return children[0] if len(children) == 1 else _And(children)
+
+        def parse_not():
+            nonlocal pos
+            if peek() == "NOT":
+                pos += 1
+                return _Not(parse_not())
+            return parse_atom()
+
+        def parse_atom():
+            nonlocal pos
+            kind = peek()
+            if kind == "(":
+                pos += 1
+                node = parse_or()
+                if peek() != ")":
+                    raise ValueError("Expressió de cerca invàlida: falta ')'")
+                pos += 1
+                return node
+            if kind == "TERM":
+                method, sub = tokens[pos][1]
+                pos += 1
+                field = self._searcher.SEARCH_FIELDS.get(method)
+                if field is None:
+                    raise ValueError(f"Camp de cerca desconegut: {method}")
+                return _Term(field, sub)
+            raise ValueError(f"Expressió de cerca invàlida: s'esperava un "
+                             f"terme i s'ha trobat {kind}")
+
+        node = parse_or()
+        if pos != len(tokens):
+            raise ValueError(f"Expressió de cerca invàlida: {tokens[pos][0]} "
+                             f"inesperat")
+        return node
+
+    def run(self, expression: str) -> list:
+        """Avalua l'expressió i retorna els ordinals ordenats."""
+        node = self.parse(expression)
+        node.plan(self._searcher)
+        return sorted(node.evaluate(self._searcher))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+ResultSet.py : Conjunt de resultats d'una cerca representat com a bitmap.
+
+Cada imatge indexada per SearchMetadata té un ordinal dens (0, 1, 2, ...).
+Un ResultSet guarda el conjunt d'ordinals com un enter de Python on el bit i
+indica si la imatge d'ordinal i hi pertany. Les operacions lògiques es fan
+amb els operadors d'enters (&, |, ^), que treballen paraula a paraula en C:
+
+    a & b       AND
+    a | b       OR
+    ~a          NOT (respecte de totes les imatges indexades)
+    a - b       AND NOT
+
+La conversió a llista d'UUID només es fa quan es demana amb to_list().
+
+Els bits de les imatges eliminades després de la cerca es conserven, però
+len(), ~, la comparació i la iteració només tenen en compte els ordinals
+vius en el moment de l'operació (el bitmap 'live' que manté el cercador).
+"""
+
+
+class ResultSet:
+    """Bitmap d'ordinals d'imatge amb operacions AND/OR/NOT/ANDNOT."""
+
+    __slots__ = ("_bits", "_uuids", "_live")
+
+    def __init__(self, bits: int, uuids: list, live):
+        self._bits = bits       # bitmap dels ordinals del resultat
+        self._uuids = uuids     # ordinal -> uuid (compartida, no es copia)
+        self._live = live       # live(uuids) -> bitmap dels ordinals vius
+
+    @classmethod
+    def from_ordinals(cls, ordinals, uuids: list, live) -> "ResultSet":
+        """Construeix el bitmap a partir d'una col·lecció d'ordinals."""
+        buffer = bytearray((len(uuids) + 7) // 8)
+        for ordinal in ordinals:
+            buffer[ordinal >> 3] |= 1 << (ordinal & 7)
+        return cls(int.from_bytes(buffer, "little"), uuids, live)
+
+    def _alive(self) -> int:
+        """Bits del resultat que encara corresponen a imatges indexades."""
+        return self._bits & self._live(self._uuids)
+
+    def _check(self, other: "ResultSet") -> None:
+        if not isinstance(other, ResultSet):
+            raise TypeError("ResultSet només es pot combinar amb ResultSet")
+        if other._uuids is not self._uuids:
+            raise ValueError("ResultSet de cercadors (o índexs) diferents")
+
+    def __and__(self, other: "ResultSet") -> "ResultSet":
+        self._check(other)
+        return ResultSet(self._bits & other._bits, self._uuids, self._live)
+
+    def __or__(self, other: "ResultSet") -> "ResultSet":
+        self._check(other)
+        return ResultSet(self._bits | other._bits, self._uuids, self._live)
+
+    def __sub__(self, other: "ResultSet") -> "ResultSet":
+        self._check(other)
+        return ResultSet(self._bits & ~other._bits, self._uuids, self._live)
+
+    def __invert__(self) -> "ResultSet":
+        # Respecte de les imatges indexades ara (incloses les afegides
+        # després de la cerca), no de les que hi havia en crear-lo
+        live = self._live(self._uuids)
+        return ResultSet(~self._bits & live, self._uuids, self._live)
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, ResultSet) and other._uuids is self._uuids
+                and other._alive() == self._alive())
+
+    def __len__(self) -> int:
+        return self._alive().bit_count()
+
+    def __bool__(self) -> bool:
+        return self._alive() != 0
+
+    def __iter__(self):
+        uuids = self._uuids
+        for ordinal in self.ordinals():
+            yield uuids[ordinal]
+
+    def ordinals(self):
+        """Itera els ordinals (vius) del resultat en ordre creixent."""
+        bits = format(self._alive(), "b")[::-1]
+        ordinal = bits.find("1")
+        while ordinal != -1:
+            yield ordinal
+            ordinal = bits.find("1", ordinal + 1)
+
+    def to_list(self) -> list:
+        """Retorna la llista d'UUID del resultat (en ordre de col·lecció)."""
+        return list(self)
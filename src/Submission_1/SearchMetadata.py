@@ -53,3 +53,498 @@ Notes:
     - Els operadors lògics NO modifiquen les llistes originals
     - Aquests mètodes NO retornen objectes Gallery, sinó llistes simples
 """
+
+import math
+import sys
+from calendar import monthrange
+from datetime import date
+from itertools import islice
+
+from QueryCache import QueryCache
+from QueryPlanner import QueryPlanner
+from ResultSet import ResultSet
+from SortedIndex import SortedIndex
+from TrigramIndex import TrigramIndex
+from ValueIndex import ValueIndex
+
+
+def _parse_int(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _parse_float(value: str):
+    # "nan" i "inf" no es poden ordenar amb la resta: no s'indexen
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _date_bound(value):
+    """Límit d'un rang de dates; llança ValueError si no és una data."""
+    bound = _parse_date(value) if isinstance(value, (str, date)) else None
+    if bound is None:
+        raise ValueError(f"Data invàlida: {value!r} (format YYYY-MM-DD)")
+    return bound
+
+
+def _number_bound(value, parse):
+    """
+    Límit d'un rang numèric: un número, o un string que es converteix amb
+    'parse' (el del camp). Llança ValueError si no és un número finit.
+    """
+    if isinstance(value, str):
+        bound = parse(value)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        bound = value
+    else:
+        bound = None
+    if bound is None or (isinstance(bound, float) and not math.isfinite(bound)):
+        raise ValueError(f"Límit invàlid: {value!r} (ha de ser un número)")
+    return bound
+
+
+class SearchMetadata:
+    """Cerques per subcadena sobre les metadades d'un ImageData."""
+
+    # Camp de metadades de cada mètode de cerca per subcadena
+    SEARCH_FIELDS = {"prompt": "Prompt", "model": "Model", "seed": "Seed",
+                     "cfg_scale": "CFG_Scale", "steps": "Steps",
+                     "sampler": "Sampler", "date": "Created_Date"}
+
+    # Camps de baixa cardinalitat indexats amb un diccionari de valors
+    VALUE_FIELDS = ("Model", "Sampler", "Steps", "CFG_Scale")
+
+    # Camps amb columna tipada i ordenada per a cerques per rang
+    SORTED_FIELDS = {"Created_Date": _parse_date, "Seed": _parse_int,
+                     "Steps": _parse_int, "CFG_Scale": _parse_float}
+
+    def __init__(self, image_data, cache_size: int = 256,
+                 cache_items: int = 1 << 20):
+        self._image_data = image_data
+        # Acotat per entrades i per UUID guardats (vegeu QueryCache)
+        self._cache = QueryCache(cache_size, cache_items)
+        self._uuids = []                    # ordinal -> uuid (None si eliminat)
+        self._ordinal_of = {}               # uuid -> ordinal
+        self._mask = 0                      # bitmap dels ordinals vius
+        self._pending = set()               # uuids sense llegir (mode lazy)
+        self._prompt_index = TrigramIndex()
+        self._value_indexes = {field: ValueIndex()
+                               for field in self.VALUE_FIELDS}
+        self._sorted_indexes = {field: SortedIndex()
+                                for field in self.SORTED_FIELDS}
+        self.reindex()
+        image_data.subscribe(self._on_change)
+
+    def close(self) -> None:
+        """Deixa de rebre els canvis d'ImageData."""
+        self._image_data.unsubscribe(self._on_change)
+
+    def reindex(self) -> None:
+        """
+        Reconstrueix els índexs a partir del contingut actual d'ImageData.
+
+        No cal cridar-lo quan la col·lecció canvia (els índexs s'actualitzen
+        incrementalment amb els esdeveniments d'ImageData), però compacta
+        els ordinals que han quedat lliures. Els ResultSet obtinguts abans
+        de reindexar ja no es poden combinar amb els nous.
+        """
+        image_data = self._image_data
+        self._uuids = image_data.uuids()
+        self._ordinal_of = {uuid: ordinal
+                            for ordinal, uuid in enumerate(self._uuids)}
+        self._mask = (1 << len(self._uuids)) - 1
+        self._pending = set()
+        loaded = []
+        for ordinal, uuid in enumerate(self._uuids):
+            if self._deferred(uuid):
+                self._pending.add(uuid)
+            else:
+                loaded.append((ordinal, uuid))
+        self._prompt_index.clear()
+        for index in self._value_indexes.values():
+            index.clear()
+        for ordinal, uuid in loaded:
+            self._prompt_index.add(ordinal, image_data.get_prompt(uuid))
+            for field, index in self._value_indexes.items():
+                index.add(ordinal, image_data.get_field(uuid, field))
+        for field, index in self._sorted_indexes.items():
+            parse = self.SORTED_FIELDS[field]
+            index.build((ordinal, parse(image_data.get_field(uuid, field)))
+                        for ordinal, uuid in loaded)
+
+    def _live_mask(self, uuids: list) -> int:
+        """
+        Bitmap dels ordinals vius de la llista 'uuids' (per als ResultSet).
+        Una llista anterior a reindex() ja no canvia: els seus ordinals vius
+        són els dels UUID que encara estan indexats.
+        """
+        if uuids is self._uuids:
+            return self._mask
+        indexed = self._ordinal_of
+        bits = "".join("1" if uuid in indexed else "0"
+                       for uuid in reversed(uuids))
+        return int(bits or "0", 2)
+
+    def _deferred(self, uuid: str) -> bool:
+        """
+        En mode lazy, les imatges encara no llegides no s'indexen en afegir-
+        les: es llegeixen totes de cop (prefetch) abans de la següent cerca.
+        """
+        image_data = self._image_data
+        return image_data.lazy and not image_data.is_loaded(uuid)
+
+    def _prepare(self) -> None:
+        """Llegeix les imatges pendents perquè els índexs siguin complets."""
+        if self._pending:
+            pending, self._pending = self._pending, set()
+            # Amb fils, no processos: una cerca no ha de crear un pool de
+            # processos, que amb spawn (macOS, Windows) tornaria a executar
+            # l'script que crida si no té la guarda de __main__
+            self._image_data.prefetch(
+                [uuid for uuid in self._uuids if uuid in pending],
+                threads=True)
+
+    def _on_change(self, event: str, uuid: str) -> None:
+        """Aplica un esdeveniment d'ImageData als índexs (cost O(1 imatge))."""
+        ordinal = self._ordinal_of.get(uuid)
+        self._pending.discard(uuid)
+        if event == "remove":
+            if ordinal is None:
+                return
+            self._unindex_image(ordinal)
+            del self._ordinal_of[uuid]
+            self._uuids[ordinal] = None
+            self._mask &= ~(1 << ordinal)
+            # Si la meitat dels ordinals són forats, es compacten
+            if len(self._ordinal_of) * 2 < len(self._uuids):
+                self.reindex()
+            return
+        if ordinal is None:
+            ordinal = len(self._uuids)
+            self._uuids.append(uuid)
+            self._ordinal_of[uuid] = ordinal
+            self._mask |= 1 << ordinal
+        # "add" i "load": els índexs substitueixen (i retiren) els valors vells
+        if self._deferred(uuid):
+            self._unindex_image(ordinal)
+            self._pending.add(uuid)
+        else:
+            self._index_image(ordinal, uuid)
+
+    def _index_image(self, ordinal: int, uuid: str) -> None:
+        get_field = self._image_data.get_field
+        self._prompt_index.add(ordinal, get_field(uuid, "Prompt"))
+        for field, index in self._value_indexes.items():
+            index.add(ordinal, get_field(uuid, field))
+        for field, index in self._sorted_indexes.items():
+            parse = self.SORTED_FIELDS[field]
+            index.add(ordinal, parse(get_field(uuid, field)))
+
+    def _unindex_image(self, ordinal: int) -> None:
+        self._prompt_index.remove(ordinal)
+        for index in self._value_indexes.values():
+            index.remove(ordinal)
+        for index in self._sorted_indexes.values():
+            index.remove(ordinal)
+
+    def _search(self, field: str, sub: str) -> list:
+        """Retorna els ordinals (ordenats) amb 'sub' dins el camp 'field'."""
+        if field == "Prompt":
+            return self._prompt_index.search(sub)
+        index = self._value_indexes.get(field)
+        if index is not None:
+            return index.search(sub)
+        get_field = self._image_data.get_field
+        return [ordinal for ordinal, uuid in enumerate(self._uuids)
+                if uuid is not None and get_field(uuid, field).find(sub) != -1]
+
+    def _statistics(self, field: str, sub: str) -> tuple:
+        """
+        Estadístiques per al planificador: (mida estimada del resultat,
+        cost estimat d'avaluar la cerca amb l'índex).
+        """
+        total = len(self._ordinal_of)
+        if field == "Prompt":
+            index = self._prompt_index
+            estimate = index.estimate(sub)
+            return estimate, (total if len(sub) < index.N else estimate)
+        index = self._value_indexes.get(field)
+        if index is not None:
+            estimate = index.estimate(sub)
+            return estimate, index.distinct() + estimate
+        return total, total
+
+    def _value(self, ordinal: int, field: str) -> str:
+        return self._image_data.get_field(self._uuids[ordinal], field)
+
+    def _size(self) -> int:
+        return len(self._ordinal_of)
+
+    def _ordinals(self) -> set:
+        return set(self._ordinal_of.values())
+
+    def _to_uuids(self, ordinals) -> list:
+        uuids = self._uuids
+        return [uuids[ordinal] for ordinal in ordinals]
+
+    def _find(self, field: str, sub: str) -> list:
+        """Cerca de subcadena amb cache LRU (clau: camp i subcadena)."""
+        self._prepare()
+        generation = self._image_data.generation
+        result = self._cache.get((field, sub), generation)
+        if result is None:
+            result = self._to_uuids(self._search(field, sub))
+            self._cache.put((field, sub), generation, result)
+        return list(result)
+
+    def cache_info(self) -> dict:
+        """Retorna els comptadors (hits, misses, evictions) del cache."""
+        return self._cache.info()
+
+    def memory_report(self) -> dict:
+        """
+        Estima la memòria (bytes) ocupada pels índexs de cerca, el total i
+        la mitjana per imatge, com ImageData.memory_report() per a les
+        columns d'ImageData. Els strings compartits amb ImageData (uuids,
+        prompts i valors dels camps) ja es compten allà i no es repeteixen.
+        """
+        getsizeof = sys.getsizeof
+        report = {
+            "ordinals": getsizeof(self._uuids) + getsizeof(self._ordinal_of)
+                        + getsizeof(self._mask) + getsizeof(self._pending),
+            "prompt_index": self._prompt_index.nbytes,
+            "value_indexes": sum(index.nbytes for index
+                                 in self._value_indexes.values()),
+            "sorted_indexes": sum(index.nbytes for index
+                                  in self._sorted_indexes.values()),
+            "cache": self._cache.nbytes,
+        }
+        total = sum(report.values())
+        report["total"] = total
+        report["per_image"] = total / len(self._ordinal_of) \
+            if self._ordinal_of else 0.0
+        return report
+
+    def _range(self, field: str, low, high) -> list:
+        self._prepare()
+        return self._to_uuids(self._sorted_indexes[field].range(low, high))
+
+    def _number_range(self, field: str, low, high) -> list:
+        parse = self.SORTED_FIELDS[field]
+        if low is not None:
+            low = _number_bound(low, parse)
+        if high is not None:
+            high = _number_bound(high, parse)
+        return self._range(field, low, high)
+
+    def prompt(self, sub: str) -> list:
+        return self._find("Prompt", sub)
+
+    def model(self, sub: str) -> list:
+        return self._find("Model", sub)
+
+    def seed(self, sub: str) -> list:
+        return self._find("Seed", sub)
+
+    def cfg_scale(self, sub: str) -> list:
+        return self._find("CFG_Scale", sub)
+
+    def steps(self, sub: str) -> list:
+        return self._find("Steps", sub)
+
+    def sampler(self, sub: str) -> list:
+        return self._find("Sampler", sub)
+
+    def date(self, sub: str) -> list:
+        return self._find("Created_Date", sub)
+
+    def date_range(self, start=None, end=None) -> list:
+        """
+        Retorna els UUID de les imatges creades entre 'start' i 'end'
+        (inclosos). Els límits són dates o strings YYYY-MM-DD; None indica
+        que el rang no està acotat. Llança ValueError si un límit no és una
+        data vàlida.
+        """
+        if start is not None:
+            start = _date_bound(start)
+        if end is not None:
+            end = _date_bound(end)
+        return self._range("Created_Date", start, end)
+
+    def date_prefix(self, prefix: str) -> list:
+        """
+        Retorna els UUID de les imatges d'un any, mes o dia concret, indicat
+        com a prefix ISO: "2024", "2024-10" o "2024-10-05". Llança
+        ValueError si el prefix no té aquest format o no és una data vàlida.
+        """
+        parts = prefix.split("-") if isinstance(prefix, str) else []
+        if not 1 <= len(parts) <= 3 or any(
+                len(part) != size or not part.isdecimal()
+                for part, size in zip(parts, (4, 2, 2))):
+            raise ValueError(f"Prefix de data invàlid: {prefix!r} "
+                             f"(format YYYY, YYYY-MM o YYYY-MM-DD)")
+        year, month, day = ([int(part) for part in parts] + [None, None])[:3]
+        try:
+            if month is None:
+                first, last = date(year, 1, 1), date(year, 12, 31)
+            elif day is None:
+                first = date(year, month, 1)
+                last = date(year, month, monthrange(year, month)[1])
+            else:
+                first = last = date(year, month, day)
+        except ValueError as e:
+            raise ValueError(f"Prefix de data invàlid: {prefix!r} ({e})")
+        return self._range("Created_Date", first, last)
+
+    def seed_range(self, low=None, high=None) -> list:
+        """
+        Retorna els UUID amb Seed dins [low, high]. Els límits són números
+        o strings numèrics; None indica que el rang no està acotat. Llança
+        ValueError si un límit no és un número.
+        """
+        return self._number_range("Seed", low, high)
+
+    def steps_range(self, low=None, high=None) -> list:
+        """Retorna els UUID amb Steps dins [low, high] (vegeu seed_range)."""
+        return self._number_range("Steps", low, high)
+
+    def cfg_scale_range(self, low=None, high=None) -> list:
+        """Retorna els UUID amb CFG_Scale dins [low, high] (vegeu seed_range)."""
+        return self._number_range("CFG_Scale", low, high)
+
+    def query(self, expression: str) -> list:
+        """
+        Retorna els UUID de les imatges que compleixen una expressió de
+        cerca, p.ex. 'prompt:"cyberpunk" AND model:SD2 AND NOT sampler:Euler'.
+        Vegeu QueryPlanner per a la sintaxi. Llança ValueError si
+        l'expressió és invàlida.
+        """
+        planner = QueryPlanner(self)
+        key = ("query", planner.normalize(expression))
+        self._prepare()
+        generation = self._image_data.generation
+        result = self._cache.get(key, generation)
+        if result is None:
+            result = self._to_uuids(planner.run(expression))
+            self._cache.put(key, generation, result)
+        return list(result)
+
+    def _stream(self, estimate: int, cost: int, wanted, search, matches):
+        """
+        Itera en ordre creixent els ordinals d'un resultat. Si només se'n
+        volen 'wanted' (offset + limit) i el resultat és ampli, recórrer les
+        imatges en ordre i aturar-se quan n'hi ha prou (cost esperat
+        wanted * total / estimate) surt més barat que calcular el resultat
+        sencer amb l'índex (cost 'cost').
+        """
+        if wanted is not None and \
+                wanted * self._size() < cost * max(estimate, 1):
+            uuids = self._uuids
+            return (ordinal for ordinal in range(len(uuids))
+                    if uuids[ordinal] is not None and matches(ordinal))
+        return iter(search())
+
+    def _paginate(self, ordinals, limit, offset: int):
+        stop = None if limit is None else offset + limit
+        uuids = self._uuids
+        return (uuids[ordinal]
+                for ordinal in islice(ordinals, offset, stop))
+
+    def iter_search(self, method: str, sub: str, limit: int = None,
+                    offset: int = 0):
+        """
+        Versió en streaming dels mètodes de cerca (p.ex.
+        iter_search("prompt", "a", limit=50)): retorna un iterador amb els
+        mateixos UUID i en el mateix ordre que prompt("a"), saltant els
+        'offset' primers i donant-ne com a molt 'limit'. Amb un límit, una
+        cerca poc selectiva s'atura en trobar prou resultats.
+        """
+        field = self.SEARCH_FIELDS[method]
+        self._prepare()
+        estimate, cost = self._statistics(field, sub)
+        ordinals = self._stream(
+            estimate, cost, None if limit is None else offset + limit,
+            lambda: self._search(field, sub),
+            lambda ordinal: self._value(ordinal, field).find(sub) != -1)
+        return self._paginate(ordinals, limit, offset)
+
+    def iter_prompt(self, sub: str, limit: int = None, offset: int = 0):
+        return self.iter_search("prompt", sub, limit, offset)
+
+    def iter_model(self, sub: str, limit: int = None, offset: int = 0):
+        return self.iter_search("model", sub, limit, offset)
+
+    def iter_seed(self, sub: str, limit: int = None, offset: int = 0):
+        return self.iter_search("seed", sub, limit, offset)
+
+    def iter_cfg_scale(self, sub: str, limit: int = None, offset: int = 0):
+        return self.iter_search("cfg_scale", sub, limit, offset)
+
+    def iter_steps(self, sub: str, limit: int = None, offset: int = 0):
+        return self.iter_search("steps", sub, limit, offset)
+
+    def iter_sampler(self, sub: str, limit: int = None, offset: int = 0):
+        return self.iter_search("sampler", sub, limit, offset)
+
+    def iter_date(self, sub: str, limit: int = None, offset: int = 0):
+        return self.iter_search("date", sub, limit, offset)
+
+    def iter_query(self, expression: str, limit: int = None,
+                   offset: int = 0):
+        """Versió en streaming de query(), amb la mateixa semàntica."""
+        node = QueryPlanner(self).parse(expression)
+        self._prepare()
+        node.plan(self)
+        ordinals = self._stream(
+            node.estimate, node.cost, None if limit is None else offset + limit,
+            lambda: sorted(node.evaluate(self)),
+            lambda ordinal: node.matches(self, ordinal))
+        return self._paginate(ordinals, limit, offset)
+
+    def select(self, method: str, sub: str) -> ResultSet:
+        """
+        Com els mètodes de cerca (p.ex. select("prompt", "cyberpunk")), però
+        retorna un ResultSet (bitmap) envers una llista d'UUID.
+        """
+        field = self.SEARCH_FIELDS[method]
+        self._prepare()
+        return ResultSet.from_ordinals(self._search(field, sub),
+                                       self._uuids, self._live_mask)
+
+    def select_all(self) -> ResultSet:
+        """Retorna un ResultSet amb totes les imatges indexades."""
+        self._prepare()
+        return ResultSet(self._mask, self._uuids, self._live_mask)
+
+    def and_operator(self, list1, list2):
+        """
+        Intersecció de dues llistes d'UUID. Si tots dos operands són
+        ResultSet, el resultat també és un ResultSet.
+        """
+        if isinstance(list1, ResultSet) and isinstance(list2, ResultSet):
+            return list1 & list2
+        other = set(list2)
+        return [uuid for uuid in list1 if uuid in other]
+
+    def or_operator(self, list1, list2):
+        """
+        Unió sense duplicats de dues llistes d'UUID. Si tots dos operands
+        són ResultSet, el resultat també és un ResultSet.
+        """
+        if isinstance(list1, ResultSet) and isinstance(list2, ResultSet):
+            return list1 | list2
+        return list(dict.fromkeys(list(list1) + list(list2)))
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+SortedIndex.py : Columna tipada i ordenada per a cerques per rang.
+
+Els camps de metadades es guarden com a strings, però alguns tenen un tipus
+natural (dates ISO, enters, reals). Aquest índex guarda els valors ja
+convertits en una llista ordenada de parelles (valor, clau), de forma que
+una cerca per rang [low, high] es resol amb dues cerques binàries (bisect)
+i el cost és O(log n + mida del resultat).
+
+Els valors que no es poden convertir (p.ex. "None") no s'indexen i per tant
+no apareixen mai en una cerca per rang. Els valors indexats han de tenir un
+ordre total (p.ex. un float NaN no en té: el conversor l'ha de descartar).
+"""
+
+import sys
+from bisect import bisect_left, bisect_right, insort
+
+
+class SortedIndex:
+    """Llista ordenada de (valor, clau) amb cerques per rang amb bisect."""
+
+    def __init__(self):
+        self._entries = []      # [(valor, clau)] ordenada
+        self._values = {}       # clau -> valor
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes de la llista, les parelles i els valors convertits."""
+        getsizeof = sys.getsizeof
+        return (getsizeof(self._entries) + getsizeof(self._values)
+                + sum(getsizeof(entry) + getsizeof(entry[0])
+                      for entry in self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._values.clear()
+
+    def build(self, items) -> None:
+        """Construeix l'índex d'una sola vegada a partir de (clau, valor)."""
+        self._values = {key: value for key, value in items
+                        if value is not None}
+        self._entries = sorted((value, key)
+                               for key, value in self._values.items())
+
+    def add(self, key: int, value) -> None:
+        """Afegeix (o substitueix) el valor d'una clau. None no s'indexa."""
+        if key in self._values:
+            self.remove(key)
+        if value is None:
+            return
+        self._values[key] = value
+        insort(self._entries, (value, key))
+
+    def remove(self, key: int) -> None:
+        """Elimina una clau de l'índex."""
+        if key not in self._values:
+            return
+        entry = (self._values.pop(key), key)
+        pos = bisect_left(self._entries, entry)
+        if pos < len(self._entries) and self._entries[pos] == entry:
+            del self._entries[pos]
+
+    def range(self, low=None, high=None) -> list:
+        """
+        Retorna les claus (ordenades) amb valor dins [low, high].
+
+        Un límit None indica que el rang no està acotat per aquell costat.
+        """
+        entries = self._entries
+        start = 0 if low is None else bisect_left(entries, (low,))
+        end = len(entries) if high is None else \
+            bisect_right(entries, (high, float("inf")))
+        return sorted(key for _, key in entries[start:end])
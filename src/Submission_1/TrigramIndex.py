@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+TrigramIndex.py : Índex invertit de trigrames per a cerques de subcadenes.
+
+Per a cada trigrama (subcadena de 3 caràcters) que apareix en algun text,
+l'índex guarda les claus (ordinals d'imatge) dels textos que el contenen,
+com un array('I') ordenat: 4 bytes per clau, envers les desenes de bytes
+per element d'un set (taula de hash i objectes int). Una cerca de subcadena
+es resol així:
+
+    1. Es calculen els trigrames de la subcadena cercada.
+    2. S'intersecten els seus postings, començant pel més petit: per cada
+       candidat es cerca (bisect) en el posting següent, avançant sempre
+       des de la posició anterior.
+    3. Es verifiquen els candidats supervivents amb str.find().
+
+El pas 3 és necessari perquè contenir tots els trigrames no implica
+contenir la subcadena. El resultat és exactament el mateix que el d'una
+cerca lineal amb str.find() (case-sensitive).
+
+Les subcadenes de menys de 3 caràcters no tenen cap trigrama: en aquest cas
+es fa una cerca lineal sobre tots els textos de l'índex.
+"""
+
+import sys
+from array import array
+from bisect import bisect_left, insort
+
+
+def _intersect(small: array, large: array) -> array:
+    """Intersecció de dos arrays ordenats (recorre el més petit)."""
+    result = array("I")
+    size = len(large)
+    pos = 0
+    for key in small:
+        pos = bisect_left(large, key, pos)
+        if pos == size:
+            break
+        if large[pos] == key:
+            result.append(key)
+    return result
+
+
+class TrigramIndex:
+    """Índex invertit de n-grames (n = 3) sobre textos identificats per clau."""
+
+    N = 3
+
+    def __init__(self):
+        self._texts = {}        # clau -> text
+        self._postings = {}     # trigrama -> array('I') de claus ordenades
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes dels diccionaris, trigrames i postings (no dels textos)."""
+        getsizeof = sys.getsizeof
+        return (getsizeof(self._texts) + getsizeof(self._postings)
+                + sum(getsizeof(gram) + getsizeof(keys)
+                      for gram, keys in self._postings.items()))
+
+    @classmethod
+    def grams(cls, text: str) -> set:
+        """Retorna el conjunt de trigrames d'un text."""
+        n = cls.N
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def clear(self) -> None:
+        self._texts.clear()
+        self._postings.clear()
+
+    def add(self, key: int, text: str) -> None:
+        """Afegeix (o substitueix) el text associat a una clau."""
+        if key in self._texts:
+            self.remove(key)
+        self._texts[key] = text
+        postings = self._postings
+        for gram in self.grams(text):
+            keys = postings.get(gram)
+            if keys is None:
+                postings[gram] = array("I", (key,))
+            elif keys[-1] < key:
+                keys.append(key)    # cas habitual: ordinals creixents
+            else:
+                insort(keys, key)
+
+    def remove(self, key: int) -> None:
+        """Elimina una clau i els seus postings de l'índex."""
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        postings = self._postings
+        for gram in self.grams(text):
+            keys = postings.get(gram)
+            if keys is None:
+                continue
+            pos = bisect_left(keys, key)
+            if pos < len(keys) and keys[pos] == key:
+                del keys[pos]
+                if not keys:
+                    del postings[gram]
+
+    def estimate(self, sub: str) -> int:
+        """
+        Cota superior del nombre de claus que contenen 'sub': la mida del
+        posting més petit dels seus trigrames.
+        """
+        if len(sub) < self.N:
+            return len(self._texts)
+        postings = self._postings
+        return min(len(postings.get(gram, ())) for gram in self.grams(sub))
+
+    def search(self, sub: str) -> list:
+        """Retorna les claus (ordenades) dels textos que contenen 'sub'."""
+        texts = self._texts
+        if len(sub) < self.N:
+            # Fallback: sense trigrames no es pot filtrar, cerca lineal
+            return sorted(key for key, text in texts.items()
+                          if text.find(sub) != -1)
+
+        postings = []
+        for gram in self.grams(sub):
+            keys = self._postings.get(gram)
+            if keys is None:
+                return []
+            postings.append(keys)
+        postings.sort(key=len)
+
+        candidates = postings[0]
+        for keys in postings[1:]:
+            candidates = _intersect(candidates, keys)
+            if not candidates:
+                return []
+        return [key for key in candidates if texts[key].find(sub) != -1]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+ValueIndex.py : Índex de diccionari de valors per a camps de baixa cardinalitat.
+
+Camps com Model, Sampler, Steps o CFG_Scale només tenen unes poques desenes
+de valors diferents dins tota la col·lecció. L'índex guarda, per a cada valor
+diferent, el conjunt de claus (ordinals d'imatge) que el tenen:
+
+    {"SD2": {0, 4, 7, ...}, "Flux": {1, 2, ...}, ...}
+
+Una cerca de subcadena només aplica str.find() sobre els valors diferents i
+uneix els postings dels que coincideixen. El cost és O(valors diferents +
+mida del resultat) envers O(imatges).
+"""
+
+import sys
+
+
+class ValueIndex:
+    """Diccionari valor -> postings sobre un camp de metadades."""
+
+    def __init__(self):
+        self._values = {}       # clau -> valor
+        self._postings = {}     # valor -> set(claus)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes dels diccionaris i postings (no dels valors)."""
+        getsizeof = sys.getsizeof
+        return (getsizeof(self._values) + getsizeof(self._postings)
+                + sum(getsizeof(keys) for keys in self._postings.values()))
+
+    def distinct(self) -> int:
+        """Retorna el nombre de valors diferents indexats."""
+        return len(self._postings)
+
+    def clear(self) -> None:
+        self._values.clear()
+        self._postings.clear()
+
+    def add(self, key: int, value: str) -> None:
+        """Afegeix (o substitueix) el valor associat a una clau."""
+        if key in self._values:
+            self.remove(key)
+        self._values[key] = value
+        keys = self._postings.get(value)
+        if keys is None:
+            self._postings[value] = {key}
+        else:
+            keys.add(key)
+
+    def remove(self, key: int) -> None:
+        """Elimina una clau de l'índex."""
+        value = self._values.pop(key, None)
+        if value is None:
+            return
+        keys = self._postings[value]
+        keys.discard(key)
+        if not keys:
+            del self._postings[value]
+
+    def estimate(self, sub: str) -> int:
+        """Retorna el nombre exacte de claus amb un valor que conté 'sub'."""
+        return sum(len(keys) for value, keys in self._postings.items()
+                   if value.find(sub) != -1)
+
+    def search(self, sub: str) -> list:
+        """Retorna les claus (ordenades) amb un valor que conté 'sub'."""
+        matches = [keys for value, keys in self._postings.items()
+                   if value.find(sub) != -1]
+        if not matches:
+            return []
+        if len(matches) == 1:
+            return sorted(matches[0])
+        return sorted(set().union(*matches))
@@ -40,6 +40,13 @@ IMAGE_DEFAULT = "0b4993aa-093c-42a6-a90a-073dce964bf0.png"
 #DISPLAY_MODE = 2  # Només "mostrar imatge" (visualització regular)
 DISPLAY_MODE = 1
 
+# Lectura de metadades PNG
+#
+# Si tots els PNG de la col·lecció tenen els chunks de text (metadades) abans
+# de les dades de la imatge (IDAT), la lectura es pot aturar en arribar al
+# primer IDAT. Per defecte es recorre tot l'arxiu (saltant les dades).
+PNG_TEXT_BEFORE_IDAT = False
+
 #############################################################################
 #
 # TOOLS: No modificar a partir d'aquest punt !!!
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+test_gallery.py : Comprova Gallery.load_file() i show(), amb i sense ImageID
+                  i ImageViewer
+
+Execució:  python -m pytest test_gallery.py   o   python test_gallery.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+# cfg.py surt si ROOT_DIR (../generated_images) no existeix: l'importem des
+# d'un directori temporal on sí que existeix
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+with tempfile.TemporaryDirectory() as _tmp:
+    os.makedirs(os.path.join(_tmp, "generated_images"))
+    os.makedirs(os.path.join(_tmp, "run"))
+    _cwd = os.getcwd()
+    os.chdir(os.path.join(_tmp, "run"))
+    try:
+        import cfg
+    finally:
+        os.chdir(_cwd)
+
+from Gallery import Gallery
+from ImageID import ImageID
+
+IMAGES = ["city_001.png", "sub/city_002.png", "city_003.png"]
+
+
+class _Viewer:
+    def __init__(self):
+        self.shown = []
+
+    def show_image(self, uuid: str) -> None:
+        self.shown.append(uuid)
+
+
+def _collection(directory: str) -> list:
+    """Crea ROOT_DIR amb IMAGES i hi apunta cfg.ROOT_DIR; retorna els paths."""
+    root = os.path.join(directory, "generated_images")
+    for image in IMAGES:
+        path = os.path.join(root, image)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+    cfg.ROOT_DIR = root
+    return [cfg.get_canonical_pathfile(os.path.join(root, image))
+            for image in IMAGES]
+
+
+def _gallery_file(directory: str, images: list) -> str:
+    path = os.path.join(directory, "gallery.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"gallery_name": "Cities", "description": "Test",
+                   "created_date": "2025-09-30", "images": images}, f)
+    return path
+
+
+def _check_load(directory: str, image_id) -> Gallery:
+    files = _collection(directory)
+    path = _gallery_file(directory, [
+        "generated_images/city_001.png",    # relatiu al pare de ROOT_DIR
+        "missing.png",                      # no existeix: s'ignora
+        "sub/city_002.png",                 # relatiu a ROOT_DIR
+        "../gallery.json",                  # fora de ROOT_DIR: s'ignora
+        42,                                 # no és un path: s'ignora
+    ])
+    gallery = Gallery(image_id)
+    gallery.load_file(path)
+    assert gallery.name == "Cities" and gallery.created_date == "2025-09-30"
+    assert gallery.images == [str(cfg.get_uuid(files[0])),
+                              str(cfg.get_uuid(files[1]))]
+    return gallery
+
+
+def _with_root(test, directory: str) -> None:
+    root = cfg.ROOT_DIR
+    try:
+        test(directory)
+    finally:
+        cfg.ROOT_DIR = root
+
+
+def test_load_with_image_id(tmp_path):
+    def test(directory):
+        image_id = ImageID()
+        for file in _collection(directory)[:2]:
+            image_id.generate_uuid(file)
+        _check_load(directory, image_id)
+    _with_root(test, str(tmp_path))
+
+
+def test_load_without_image_id(tmp_path):
+    _with_root(lambda directory: _check_load(directory, None), str(tmp_path))
+
+
+def test_load_invalid_file(tmp_path):
+    gallery = Gallery()
+    gallery.load_file(str(tmp_path / "missing.json"))
+    (tmp_path / "list.json").write_text("[]")
+    gallery.load_file(str(tmp_path / "list.json"))
+    assert gallery.images == [] and gallery.name is None
+
+
+def test_show():
+    viewer = _Viewer()
+    gallery = Gallery(viewer=viewer)
+    for uuid in ("a", "b", "c"):
+        gallery.add_image_at_end(uuid)
+    gallery.remove_first_image()
+    gallery.show()
+    assert viewer.shown == ["b", "c"]
+    # Sense ImageViewer només es mostra un error
+    Gallery().show()
+
+
+if __name__ == "__main__":
+    import pathlib
+    for test in (test_load_with_image_id, test_load_without_image_id,
+                 test_load_invalid_file):
+        with tempfile.TemporaryDirectory() as directory:
+            test(pathlib.Path(directory))
+    test_show()
+    print("OK")
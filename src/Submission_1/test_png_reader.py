@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+test_png_reader.py : Comprova que PngReader retorna el mateix que les eines
+                     de cfg.py (read_png_metadata, get_png_dimensions) amb
+                     PNG sintètics
+
+Execució:  python -m pytest test_png_reader.py   o   python test_png_reader.py
+"""
+
+import os
+import sys
+import tempfile
+import zlib
+
+# cfg.py surt si ROOT_DIR (../generated_images) no existeix: l'importem des
+# d'un directori temporal on sí que existeix
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+with tempfile.TemporaryDirectory() as _tmp:
+    os.makedirs(os.path.join(_tmp, "generated_images"))
+    os.makedirs(os.path.join(_tmp, "run"))
+    _cwd = os.getcwd()
+    os.chdir(os.path.join(_tmp, "run"))
+    try:
+        import cfg
+    finally:
+        os.chdir(_cwd)
+
+import PngReader
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(chunk_type + data).to_bytes(4, 'big')
+    return len(data).to_bytes(4, 'big') + chunk_type + data + crc
+
+
+def _ihdr(width: int, height: int) -> bytes:
+    return _chunk(b'IHDR', width.to_bytes(4, 'big') + height.to_bytes(4, 'big')
+                  + bytes([8, 2, 0, 0, 0]))
+
+
+def _itxt(keyword: str, text: str, compressed: int = 0) -> bytes:
+    return _chunk(b'iTXt', keyword.encode('latin-1') + b'\x00'
+                  + bytes([compressed, 0]) + b'en\x00' + b'\x00'
+                  + text.encode('utf-8'))
+
+
+def _text(keyword: str, text: str) -> bytes:
+    return _chunk(b'tEXt', keyword.encode('latin-1') + b'\x00'
+                  + text.encode('latin-1'))
+
+
+IDAT = _chunk(b'IDAT', zlib.compress(bytes(3 * 64 * 64 + 64)))
+IEND = _chunk(b'IEND', b'')
+
+CASES = {
+    "text": [_ihdr(64, 64), _text("Prompt", "a red fox"),
+             _text("Seed", "42"), IDAT, IEND],
+    "itxt": [_ihdr(64, 64), _itxt("Prompt", "guineu vermella · ñ"),
+             _itxt("Model", "zipped", compressed=1), IDAT, IEND],
+    "text_after_idat": [_ihdr(64, 64), IDAT, _text("Prompt", "late"),
+                        _itxt("Sampler", "Euler a"), IEND],
+    "empty_text": [_ihdr(64, 64), _chunk(b'tEXt', b''),
+                   _chunk(b'tEXt', b'Key\x00'), IDAT, IEND],
+    "no_text": [_ihdr(64, 64), IDAT, IEND],
+    "after_iend": [_ihdr(64, 64), IDAT, IEND, _text("Prompt", "ignored")],
+}
+
+
+def _write(directory: str, name: str, data: bytes) -> str:
+    path = os.path.join(directory, name + ".png")
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _files(directory: str) -> list:
+    """(nom, path) de tots els casos, complets i truncats a cada byte."""
+    files = []
+    for name, chunks in CASES.items():
+        data = PngReader.PNG_SIGNATURE + b''.join(chunks)
+        files.append((name, _write(directory, name, data)))
+        # Truncats a cada byte: dins de capçaleres, dades i CRC
+        for cut in range(8, len(data)):
+            files.append((f"{name}[:{cut}]",
+                          _write(directory, f"{name}_{cut}", data[:cut])))
+    files.append(("not_png",
+                  _write(directory, "not_png", b'GIF89a' + bytes(32))))
+    files.append(("missing", os.path.join(directory, "missing.png")))
+    return files
+
+
+def test_same_metadata_as_cfg(tmp_path):
+    for name, path in _files(str(tmp_path)):
+        expected = cfg.read_png_metadata(path)
+        assert PngReader.read_png_metadata(path) == expected, name
+
+
+def test_dimensions_as_cfg(tmp_path):
+    for name, path in _files(str(tmp_path)):
+        if "[" in name or name == "missing":
+            continue
+        info = PngReader.read_png_info(path)
+        expected = cfg.get_png_dimensions(path)
+        if info is None:
+            assert expected == (None, None), name
+        else:
+            assert (info["width"], info["height"]) == expected, name
+
+
+def test_text_after_idat(tmp_path):
+    path = _write(str(tmp_path), "late", PngReader.PNG_SIGNATURE
+                  + b''.join(CASES["text_after_idat"]))
+    assert PngReader.read_png_metadata(path) == {"Prompt": "late",
+                                                 "Sampler": "Euler a"}
+    # Amb stop_at_idat la lectura s'atura abans de les metadades
+    assert PngReader.read_png_metadata(path, stop_at_idat=True) == {}
+
+
+if __name__ == "__main__":
+    for test in (test_same_metadata_as_cfg, test_dimensions_as_cfg,
+                 test_text_after_idat):
+        with tempfile.TemporaryDirectory() as directory:
+            test(directory)
+    print("OK")
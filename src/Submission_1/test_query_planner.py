@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+test_query_planner.py : Comprova l'ordre de les branques d'un AND, l'elecció
+                        entre verificar candidats i avaluar amb l'índex, i
+                        els resultats de QueryPlanner contra una avaluació
+                        directa amb str.find()
+
+Execució:  python -m pytest test_query_planner.py   o
+           python test_query_planner.py
+
+Les proves fan servir un cercador mínim amb la interfície que QueryPlanner
+espera de SearchMetadata (_statistics, _search, _value, _size, _ordinals),
+de forma que les estadístiques de cada camp es poden fixar a mà.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from QueryPlanner import QueryPlanner, _And, _Not
+
+MODELS = ["SD2", "SD3.5", "Flux", "Dalle2"]
+SAMPLERS = ["Euler", "Euler a", "ddim"]
+WORDS = "cyberpunk city neon dragon cat snow castle a of".split()
+
+
+class _Searcher:
+    """Col·lecció en memòria amb estadístiques exactes o fixades."""
+
+    SEARCH_FIELDS = {"prompt": "Prompt", "model": "Model",
+                     "sampler": "Sampler"}
+
+    def __init__(self, rows: list, costs: dict = None):
+        self.rows = rows
+        self.costs = costs or {}    # camp -> cost fixat d'avaluar-lo
+        self.searches = []          # camps avaluats amb _search()
+        self.verified = 0           # valors llegits per verificar
+
+    def _search(self, field: str, sub: str) -> list:
+        self.searches.append(field)
+        return [ordinal for ordinal, row in enumerate(self.rows)
+                if row[field].find(sub) != -1]
+
+    def _statistics(self, field: str, sub: str) -> tuple:
+        estimate = sum(row[field].find(sub) != -1 for row in self.rows)
+        return estimate, self.costs.get(field, estimate)
+
+    def _value(self, ordinal: int, field: str) -> str:
+        self.verified += 1
+        return self.rows[ordinal][field]
+
+    def _size(self) -> int:
+        return len(self.rows)
+
+    def _ordinals(self) -> set:
+        return set(range(len(self.rows)))
+
+
+def _rows(count: int = 300, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    return [{"Prompt": " ".join(rnd.choice(WORDS)
+                                for _ in range(rnd.randint(1, 6))),
+             "Model": rnd.choice(MODELS), "Sampler": rnd.choice(SAMPLERS)}
+            for _ in range(count)]
+
+
+def _naive(rows: list, field: str, sub: str) -> set:
+    return {ordinal for ordinal, row in enumerate(rows)
+            if row[field].find(sub) != -1}
+
+
+def test_results_as_naive_scan():
+    rows = _rows()
+    everything = set(range(len(rows)))
+    prompt = lambda sub: _naive(rows, "Prompt", sub)         # noqa: E731
+    model = lambda sub: _naive(rows, "Model", sub)           # noqa: E731
+    sampler = lambda sub: _naive(rows, "Sampler", sub)       # noqa: E731
+    cases = {
+        'prompt:"cat" AND model:SD2 AND NOT sampler:Euler':
+            prompt("cat") & model("SD2") - sampler("Euler"),
+        '(model:SD2 OR model:Flux) AND sampler:ddim':
+            (model("SD2") | model("Flux")) & sampler("ddim"),
+        'NOT prompt:a': everything - prompt("a"),
+        'prompt:"dragon cat" OR model:Dalle':
+            prompt("dragon cat") | model("Dalle"),
+        'NOT NOT model:SD AND NOT (sampler:Euler OR prompt:neon)':
+            model("SD") - sampler("Euler") - prompt("neon"),
+        'prompt:"a \\"q\\"" AND model:SD': set(),
+        'model:AND': model("AND"),
+    }
+    for costs in ({}, {"Model": 0, "Sampler": 0, "Prompt": 0}):
+        searcher = _Searcher(rows, costs)
+        for expression, expected in cases.items():
+            result = QueryPlanner(searcher).run(expression)
+            assert result == sorted(expected), (expression, costs)
+
+
+def test_and_order():
+    rows = _rows()
+    searcher = _Searcher(rows)
+    node = QueryPlanner(searcher).parse(
+        'NOT sampler:ddim AND model:S AND prompt:"dragon" AND model:Flux')
+    node.plan(searcher)
+    assert isinstance(node, _And)
+    estimates = [child.estimate for child in node.children]
+    # Les branques més selectives primer i els NOT al final
+    assert isinstance(node.children[-1], _Not)
+    assert estimates[:-1] == sorted(estimates[:-1])
+    assert node.estimate == min(estimates)
+
+
+def test_verify_or_evaluate():
+    rows = _rows()
+    expression = 'model:Flux AND prompt:"cat"'
+    expected = sorted(_naive(rows, "Model", "Flux")
+                      & _naive(rows, "Prompt", "cat"))
+    candidates = len(_naive(rows, "Model", "Flux"))
+
+    # Amb el cost exacte (>= candidats), el prompt es verifica candidat a
+    # candidat sobre els supervivents del model
+    searcher = _Searcher(rows)
+    assert QueryPlanner(searcher).run(expression) == expected
+    assert searcher.searches == ["Model"]
+    assert searcher.verified == candidates
+
+    # Si avaluar el prompt amb l'índex és més barat que verificar tots els
+    # candidats, s'avalua amb l'índex i s'intersecta
+    searcher = _Searcher(rows, {"Prompt": candidates - 1})
+    node = QueryPlanner(searcher).parse(expression)
+    node.plan(searcher)
+    assert [child.field for child in node.children] == ["Model", "Prompt"]
+    assert sorted(node.evaluate(searcher)) == expected
+    assert searcher.searches == ["Model", "Prompt"]
+    assert searcher.verified == 0
+
+
+def test_invalid_expressions():
+    planner = QueryPlanner(_Searcher(_rows(10)))
+    for expression in ['', 'foo:x', 'prompt:x AND', '(prompt:x',
+                       'prompt:x)', 'AND', 'prompt:"x']:
+        try:
+            planner.run(expression)
+        except ValueError:
+            continue
+        raise AssertionError(f"expressió acceptada: {expression!r}")
+    assert QueryPlanner.normalize("model:SD  AND prompt:x") == \
+        QueryPlanner.normalize("model:SD AND prompt:x")
+
+
+if __name__ == "__main__":
+    test_results_as_naive_scan()
+    test_and_order()
+    test_verify_or_evaluate()
+    test_invalid_expressions()
+    print("OK")
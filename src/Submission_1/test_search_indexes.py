@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+test_search_indexes.py : Comprova TrigramIndex, ValueIndex, SortedIndex i
+                         ResultSet contra una cerca lineal amb str.find()
+                         (o la comparació directa dels valors)
+
+Execució:  python -m pytest test_search_indexes.py   o
+           python test_search_indexes.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ResultSet import ResultSet
+from SortedIndex import SortedIndex
+from TrigramIndex import TrigramIndex
+from ValueIndex import ValueIndex
+
+WORDS = ("cyberpunk city neon dragon cat snow mountain castle forest ocean "
+         "a an of portrait art").split()
+VALUES = ["SD2", "SD3.5", "Flux", "Midjourney", "None"]
+QUERIES = ["", "a", "at", "cat", "dragon cat", "n c", "city neon", "zzz",
+           "SD", "3.5", "None", "ocean a"]
+
+
+def _naive(texts: dict, sub: str) -> list:
+    return sorted(key for key, text in texts.items() if text.find(sub) != -1)
+
+
+def _edit(index, texts: dict, rnd, new_text) -> None:
+    """Elimina, torna a afegir i substitueix claus a l'índex i a 'texts'."""
+    keys = list(texts)
+    for key in rnd.sample(keys, len(keys) // 3):
+        index.remove(key)
+        del texts[key]
+    index.remove(10**6)                     # clau inexistent: no fa res
+    for key in rnd.sample(keys, len(keys) // 3):
+        texts[key] = new_text()             # re-afegides i substituïdes
+        index.add(key, texts[key])
+
+
+def test_trigram_index():
+    rnd = random.Random(1)
+
+    def prompt():
+        return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(0, 8)))
+
+    index = TrigramIndex()
+    texts = {}
+    for key in rnd.sample(range(400), 300):     # ordre no creixent
+        texts[key] = prompt()
+        index.add(key, texts[key])
+    for _ in range(3):
+        for sub in QUERIES:
+            assert index.search(sub) == _naive(texts, sub), sub
+            assert index.estimate(sub) >= len(_naive(texts, sub)), sub
+        _edit(index, texts, rnd, prompt)
+    assert len(index) == len(texts)
+    index.clear()
+    assert index.search("cat") == [] and len(index) == 0
+
+
+def test_value_index():
+    rnd = random.Random(2)
+    index = ValueIndex()
+    texts = {}
+    for key in range(300):
+        texts[key] = rnd.choice(VALUES)
+        index.add(key, texts[key])
+    for _ in range(3):
+        for sub in QUERIES:
+            assert index.search(sub) == _naive(texts, sub), sub
+            assert index.estimate(sub) == len(_naive(texts, sub)), sub
+        assert index.distinct() == len(set(texts.values()))
+        _edit(index, texts, rnd, lambda: rnd.choice(VALUES))
+
+
+def test_sorted_index():
+    rnd = random.Random(3)
+
+    def value():
+        return rnd.choice([None, rnd.randint(0, 50), rnd.randint(0, 50) / 2])
+
+    index = SortedIndex()
+    index.build((key, value()) for key in range(200))
+    values = {key: value for value, key in index._entries}
+    for key in range(200, 300):
+        values[key] = value()
+        index.add(key, values[key])
+    values = {key: value for key, value in values.items() if value is not None}
+
+    def naive(low, high) -> list:
+        return sorted(key for key, value in values.items()
+                      if (low is None or value >= low)
+                      and (high is None or value <= high))
+
+    for _ in range(3):
+        for low, high in [(None, None), (10, 20), (10.5, 10.5), (None, 5),
+                          (40, None), (30, 10), (-5, -1)]:
+            assert index.range(low, high) == naive(low, high), (low, high)
+        for key in rnd.sample(sorted(values), len(values) // 3):
+            index.remove(key)
+            del values[key]
+        for key in rnd.sample(range(300), 60):
+            values[key] = value()
+            index.add(key, values[key])     # None elimina la clau
+            if values[key] is None:
+                del values[key]
+        assert len(index) == len(values)
+
+
+def test_result_set():
+    rnd = random.Random(4)
+    uuids = [f"u{i}" for i in range(150)]
+    removed = set()
+
+    def live(table: list) -> int:
+        return sum(1 << i for i in range(len(table)) if i not in removed)
+
+    def make(ordinals: set) -> ResultSet:
+        return ResultSet.from_ordinals(ordinals, uuids, live)
+
+    def check(result: ResultSet, expected: set) -> None:
+        expected = sorted(expected - removed)
+        assert list(result.ordinals()) == expected
+        assert result.to_list() == [uuids[i] for i in expected]
+        assert len(result) == len(expected)
+        assert bool(result) == bool(expected)
+
+    everything = set(range(len(uuids)))
+    for _ in range(5):
+        a = set(rnd.sample(range(len(uuids)), 60))
+        b = set(rnd.sample(range(len(uuids)), 60))
+        check(make(a) & make(b), a & b)
+        check(make(a) | make(b), a | b)
+        check(make(a) - make(b), a - b)
+        check(~make(a), everything - a)
+        check(~~make(a), a)
+        alive = min(everything - removed)
+        assert make(a) == make(set(a)) and make(a) != make(a ^ {alive})
+        # Les imatges eliminades després de la cerca no compten
+        result = make(a)
+        removed.update(rnd.sample(range(len(uuids)), 10))
+        check(result, a)
+        check(~result, everything - a)
+
+    other = ResultSet.from_ordinals([], list(uuids), live)
+    for operation in (lambda: make(set()) & other, lambda: make(set()) | 1):
+        try:
+            operation()
+        except (ValueError, TypeError):
+            continue
+        raise AssertionError("s'han combinat ResultSet incompatibles")
+
+
+if __name__ == "__main__":
+    test_trigram_index()
+    test_value_index()
+    test_sorted_index()
+    test_result_set()
+    print("OK")
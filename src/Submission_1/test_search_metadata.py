@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+test_search_metadata.py : Comprova SearchMetadata (índexs, cerques per rang,
+                          ResultSet i expressions) contra una cerca lineal
+                          amb str.find() sobre ImageData, també després
+                          d'eliminar, tornar a afegir i modificar imatges
+
+Execució:  python -m pytest test_search_metadata.py   o
+           python test_search_metadata.py
+"""
+
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import zlib
+
+# cfg.py surt si ROOT_DIR (../generated_images) no existeix: l'importem des
+# d'un directori temporal on sí que existeix
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+with tempfile.TemporaryDirectory() as _tmp:
+    os.makedirs(os.path.join(_tmp, "generated_images"))
+    os.makedirs(os.path.join(_tmp, "run"))
+    _cwd = os.getcwd()
+    os.chdir(os.path.join(_tmp, "run"))
+    try:
+        import cfg
+    finally:
+        os.chdir(_cwd)
+
+from ImageData import ImageData
+from SearchMetadata import SearchMetadata
+
+WORDS = ("portrait art digital fantasy cyberpunk city neon dragon cat snow "
+         "castle a of").split()
+MODELS = ["SD2", "SD3.5", "Flux", "Dalle2"]
+SAMPLERS = ["k_lms", "k_euler", "Euler", "ddim"]
+FIELDS = {"prompt": "Prompt", "model": "Model", "seed": "Seed",
+          "cfg_scale": "CFG_Scale", "steps": "Steps", "sampler": "Sampler",
+          "date": "Created_Date"}
+QUERIES = ["", "a", "at", "cat", "dragon cat", "t p", "zzz", "SD", "k_",
+           "Euler", "5", "0", "None", "2024-1", "7.5"]
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(chunk_type + data).to_bytes(4, 'big')
+    return len(data).to_bytes(4, 'big') + chunk_type + data + crc
+
+
+def _write_png(path: str, rnd) -> None:
+    metadata = {
+        "Prompt": " ".join(rnd.choice(WORDS)
+                           for _ in range(rnd.randint(1, 8))),
+        "Seed": str(rnd.randint(0, 2**32)),
+        "CFG_Scale": rnd.choice(["7", "7.5", "8", "12", "nan"]),
+        "Steps": rnd.choice(["20", "30", "50", "100"]),
+        "Sampler": rnd.choice(SAMPLERS),
+        "Model": rnd.choice(MODELS),
+        "Created_Date": f"2024-{rnd.randint(1, 12):02d}-"
+                        f"{rnd.randint(1, 28):02d}",
+    }
+    if rnd.random() < 0.1:
+        del metadata["Steps"]               # camp absent: "None"
+    data = b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', bytes(4) + bytes(4)
+                                          + bytes([8, 2, 0, 0, 0]))
+    for key, value in metadata.items():
+        data += _chunk(b'tEXt', key.encode('latin-1') + b'\x00'
+                       + value.encode('latin-1'))
+    data += _chunk(b'IDAT', zlib.compress(bytes(64))) + _chunk(b'IEND', b'')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@contextlib.contextmanager
+def _collection(directory: str, count: int = 200, lazy: bool = False):
+    """ImageData amb 'count' PNG sintètics dins un ROOT_DIR temporal."""
+    root = cfg.ROOT_DIR
+    cfg.ROOT_DIR = os.path.join(str(directory), "generated_images")
+    try:
+        rnd = random.Random(1)
+        data = ImageData(lazy=lazy)
+        files = []
+        for i in range(count):
+            file = f"sub{i % 3}/img_{i:04d}.png" if i % 2 else f"img_{i:04d}.png"
+            _write_png(os.path.join(cfg.ROOT_DIR, file), rnd)
+            files.append(file)
+            uuid = str(cfg.get_uuid(file))
+            data.add_image(uuid, file)
+            if not lazy:
+                data.load_metadata(uuid)
+        yield data, files
+    finally:
+        cfg.ROOT_DIR = root
+
+
+def _naive(data: ImageData, field: str, sub: str) -> list:
+    return [uuid for uuid in data.uuids()
+            if data.get_field(uuid, field).find(sub) != -1]
+
+
+def _naive_range(data: ImageData, field: str, parse, low, high) -> list:
+    result = []
+    for uuid in data.uuids():
+        try:
+            value = parse(data.get_field(uuid, field))
+        except ValueError:
+            continue
+        if value == value and (low is None or value >= low) and \
+                (high is None or value <= high):
+            result.append(uuid)
+    return result
+
+
+def _check(data: ImageData, searcher: SearchMetadata) -> None:
+    """Cerques, rangs, bitmaps i expressions contra la cerca lineal."""
+    for method, field in FIELDS.items():
+        for sub in QUERIES:
+            expected = _naive(data, field, sub)
+            assert getattr(searcher, method)(sub) == expected, (method, sub)
+            assert searcher.select(method, sub).to_list() == expected
+            assert list(searcher.iter_search(method, sub, limit=5,
+                                             offset=2)) == expected[2:7]
+    assert searcher.steps_range(20, 50) == \
+        _naive_range(data, "Steps", int, 20, 50)
+    assert searcher.cfg_scale_range("7.5", None) == \
+        _naive_range(data, "CFG_Scale", float, 7.5, None)
+    assert searcher.seed_range(None, 2**31) == \
+        _naive_range(data, "Seed", int, None, 2**31)
+
+    everything = data.uuids()
+    a, b = searcher.select("prompt", "cat"), searcher.select("model", "SD")
+    cat, sd = set(_naive(data, "Prompt", "cat")), set(_naive(data, "Model", "SD"))
+    assert (a & b).to_list() == [u for u in everything if u in cat & sd]
+    assert (a | b).to_list() == [u for u in everything if u in cat | sd]
+    assert (a - b).to_list() == [u for u in everything if u in cat - sd]
+    assert (~a).to_list() == [u for u in everything if u not in cat]
+    assert len(searcher.select_all()) == len(data)
+
+    euler = set(_naive(data, "Sampler", "Euler"))
+    flux = set(_naive(data, "Model", "Flux"))
+    steps = set(_naive(data, "Steps", "50"))
+    cases = {
+        'prompt:"cat" AND model:SD AND NOT sampler:Euler': cat & sd - euler,
+        '(model:SD OR model:Flux) AND steps:50': (sd | flux) & steps,
+        'NOT prompt:cat': set(everything) - cat,
+        'date:2024-1 AND NOT NOT cfg_scale:7.5':
+            set(_naive(data, "Created_Date", "2024-1"))
+            & set(_naive(data, "CFG_Scale", "7.5")),
+    }
+    for expression, expected in cases.items():
+        expected = [u for u in everything if u in expected]
+        assert searcher.query(expression) == expected, expression
+        assert list(searcher.iter_query(expression, limit=3)) == expected[:3]
+
+
+def test_search_as_naive_scan(tmp_path):
+    with _collection(tmp_path) as (data, _):
+        _check(data, SearchMetadata(data))
+
+
+def test_lazy_collection(tmp_path):
+    with _collection(tmp_path, lazy=True) as (data, _):
+        searcher = SearchMetadata(data)
+        _check(data, searcher)
+
+
+def test_incremental_maintenance(tmp_path):
+    with _collection(tmp_path) as (data, files):
+        searcher = SearchMetadata(data)
+        rnd = random.Random(2)
+        for step in range(200):
+            file = rnd.choice(files)
+            uuid = str(cfg.get_uuid(file))
+            operation = rnd.random()
+            if operation < 0.3:
+                data.remove_image(uuid)
+            elif operation < 0.6:
+                if uuid not in data.uuids():
+                    data.add_image(uuid, file)
+                data.load_metadata(uuid)
+            elif uuid in data.uuids():
+                # PNG sobreescrit amb noves metadades
+                _write_png(os.path.join(cfg.ROOT_DIR, file), rnd)
+                data.load_metadata(uuid)
+            if step % 40 == 0:
+                _check(data, searcher)
+        _check(data, searcher)
+
+
+def test_compaction(tmp_path):
+    with _collection(tmp_path) as (data, files):
+        searcher = SearchMetadata(data)
+        old = searcher.select("prompt", "a")
+        for file in files[:150]:
+            data.remove_image(str(cfg.get_uuid(file)))
+        # Quan més de la meitat dels ordinals són lliures, l'índex es compacta
+        assert len(data) == 50
+        assert len(searcher._uuids) < len(files)
+        assert len(searcher._uuids) <= 2 * len(data)
+        _check(data, searcher)
+        # Els ResultSet d'abans de compactar només mantenen les imatges vives
+        assert set(old.to_list()) <= set(_naive(data, "Prompt", "a"))
+        for file in files[:150]:
+            uuid = str(cfg.get_uuid(file))
+            data.add_image(uuid, file)
+            data.load_metadata(uuid)
+        _check(data, searcher)
+
+
+if __name__ == "__main__":
+    for test in (test_search_as_naive_scan, test_lazy_collection,
+                 test_incremental_maintenance, test_compaction):
+        with tempfile.TemporaryDirectory() as directory:
+            test(directory)
+    print("OK")
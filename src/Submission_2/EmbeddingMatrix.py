@@ -0,0 +1,103 @@
+"""
+EmbeddingMatrix.py - Contiguous L2-normalized embedding matrix and dot kernels
+
+The normalized embeddings are kept as one flat float32 array (row-major), so
+the cosine similarity of two rows is a single dot product. This module is
+shared by RecommenderSystem and by its approximate indexes (IVFIndex, ...).
+
+Pure Python has no vectorized dot product, but math.dist() walks two
+sequences in C. For any vectors
+    a . b = (|a|^2 + |b|^2 - |a - b|^2) / 2
+so each row costs one C call instead of a Python loop over 512 floats.
+Unpacking a float32 row into Python floats costs as much as math.dist()
+itself, so callers that score the same rows many times (tiles of queries,
+centroids) unpack them once with rows() and use dot_vectors().
+"""
+
+import math
+from array import array
+
+
+class EmbeddingMatrix:
+    """
+    L2-normalized embeddings as contiguous float32 rows.
+
+    Attributes:
+        dim: Length of each row
+        data: Flat float32 array with count * dim values
+        norms2: Squared norm of each normalized row (1.0, or 0.0 for a zero
+                embedding)
+    """
+
+    def __init__(self, vectors, dim: int):
+        """
+        Args:
+            vectors: Flat sequence of floats (count * dim), e.g. the image
+                     matrix of a VectorStore
+            dim: Length of each embedding
+        """
+        self.dim = dim
+        self.data = array("f")
+        self.norms2 = array("d")
+        for start in (range(0, len(vectors), dim) if dim else ()):
+            self.append(vectors[start:start + dim])
+
+    def __len__(self) -> int:
+        return len(self.norms2)
+
+    @staticmethod
+    def normalize(vector) -> list:
+        """Returns vector / |vector| (the vector itself if it is zero)."""
+        norm = math.hypot(*vector)
+        return [x / norm for x in vector] if norm else list(vector)
+
+    @staticmethod
+    def norm2(vector) -> float:
+        return math.fsum(x * x for x in vector)
+
+    def append(self, vector) -> int:
+        """Normalizes and appends a new row; returns its row number."""
+        start = len(self.data)
+        self.data.extend(self.normalize(vector))
+        # Norm of the stored float32 values, not of the float64 ones
+        self.norms2.append(self.norm2(self.data[start:]))
+        return len(self.norms2) - 1
+
+    def vector(self, row: int) -> tuple:
+        """Row as a tuple of Python floats (ready for math.dist)."""
+        dim = self.dim
+        return tuple(self.data[row * dim:(row + 1) * dim].tolist())
+
+    def rows(self, start: int, stop: int) -> list:
+        """Rows [start, stop) as tuples of Python floats."""
+        dim = self.dim
+        values = self.data[start * dim:stop * dim].tolist()
+        return [tuple(values[i:i + dim]) for i in range(0, len(values), dim)]
+
+    @staticmethod
+    def dot_vectors(query: tuple, vectors: list, norms2) -> list:
+        """
+        Dot products of 'query' with already unpacked 'vectors', whose
+        squared norms are 'norms2'.
+        """
+        dist = math.dist
+        query2 = EmbeddingMatrix.norm2(query)
+        return [(query2 + norm2 - dist(query, vector) ** 2) / 2
+                for norm2, vector in zip(norms2, vectors)]
+
+    def dot(self, query: tuple, start: int = 0, stop: int = None) -> list:
+        """Dot products of 'query' with rows [start, stop)."""
+        if stop is None:
+            stop = len(self)
+        return self.dot_rows(query, range(start, stop))
+
+    def dot_rows(self, query: tuple, rows) -> list:
+        """Dot products of 'query' with the given (arbitrary) rows."""
+        dim = self.dim
+        data = self.data
+        norms2 = self.norms2
+        dist = math.dist
+        query2 = self.norm2(query)
+        return [(query2 + norms2[row]
+                 - dist(query, data[row * dim:(row + 1) * dim]) ** 2) / 2
+                for row in rows]
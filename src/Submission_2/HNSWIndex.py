@@ -0,0 +1,185 @@
+"""
+HNSWIndex.py - Hierarchical Navigable Small World graph index
+
+Each row of the normalized matrix is a node of a layered proximity graph
+(Malkov & Yashunin). Every node lives on layer 0 and, with exponentially
+decreasing probability, on higher layers. A new node is linked on each layer
+to at most M neighbours chosen with the paper's heuristic, so that the links
+also bridge separate clusters; a node receiving links keeps at most M of
+them (2 * M on layer 0), reselected with the same heuristic. A query
+greedily descends from the entry point through the sparse upper layers and
+then runs a best-first search with a beam of 'ef_search' nodes on layer 0,
+so it only computes distances to a small neighbourhood of the answer.
+
+Tuning: M and ef_construction trade build time and memory for graph quality;
+ef_search (>= k, changeable at any time) trades query time for recall.
+Distances are Euclidean between normalized vectors, which rank like cosine
+similarity; results are reported with their exact cosine score.
+"""
+
+import heapq
+import math
+import random
+from array import array
+
+from EmbeddingMatrix import EmbeddingMatrix
+
+
+class HNSWIndex:
+    """
+    Layered proximity graph over the rows of an EmbeddingMatrix.
+
+    Attributes:
+        M: Maximum links per node on the upper layers (2 * M on layer 0)
+        ef_construction: Beam width when inserting a node
+        ef_search: Beam width when querying
+        links: links[row][layer] -> array of neighbour rows
+        distances: distances[row][layer] -> distance to each of those rows
+        entry: Entry point row (on the top layer), None if empty
+    """
+
+    def __init__(self, matrix: EmbeddingMatrix, M: int = 12,
+                 ef_construction: int = 64, ef_search: int = 32,
+                 seed: int = 0):
+        """
+        Builds the graph by inserting every row of 'matrix' in order.
+
+        Args:
+            matrix: Normalized embeddings to index
+            M: Links per node (memory and build time grow with M)
+            ef_construction: Beam width used while building
+            ef_search: Beam width used by search() (at least k is used)
+            seed: Seed of the random layer assignment
+        """
+        self.matrix = matrix
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_factor = 1 / math.log(max(M, 2))
+        self._random = random.Random(seed)
+        self.links = []
+        self.distances = []
+        self.entry = None
+        self._top = -1          # layer of the entry point
+        for row in range(len(matrix)):
+            self.add(row)
+
+    def _distance(self, vector: tuple, row: int) -> float:
+        dim = self.matrix.dim
+        return math.dist(vector, self.matrix.data[row * dim:(row + 1) * dim])
+
+    def _search_layer(self, vector: tuple, entries: list, ef: int,
+                      layer: int) -> list:
+        """
+        Best-first search on one layer from 'entries' [(distance, row)].
+        Returns the 'ef' closest nodes found as [(distance, row)], unsorted.
+        """
+        distance = self._distance
+        links = self.links
+        visited = {row for _, row in entries}
+        candidates = list(entries)              # min-heap by distance
+        heapq.heapify(candidates)
+        found = [(-d, row) for d, row in entries]   # max-heap by distance
+        heapq.heapify(found)
+        while len(found) > ef:
+            heapq.heappop(found)
+        while candidates:
+            d, row = heapq.heappop(candidates)
+            if d > -found[0][0]:
+                break
+            for neighbour in links[row][layer]:
+                if neighbour in visited:
+                    continue
+                visited.add(neighbour)
+                d = distance(vector, neighbour)
+                if len(found) < ef or d < -found[0][0]:
+                    heapq.heappush(candidates, (d, neighbour))
+                    heapq.heappush(found, (-d, neighbour))
+                    if len(found) > ef:
+                        heapq.heappop(found)
+        return [(-d, row) for d, row in found]
+
+    def _select(self, candidates: list, limit: int) -> list:
+        """
+        Neighbour selection heuristic (Algorithm 4 of the paper): going from
+        the closest candidate [(distance, row)] to the farthest, a candidate
+        is kept only if it is closer to the base node than to every
+        neighbour already kept. Candidates hidden behind a kept neighbour
+        (same cluster, same direction) are skipped, so the links spread out
+        and keep the bridges between clusters that plain nearest-neighbour
+        lists lose.
+        """
+        dist = math.dist
+        selected = []
+        vectors = []
+        for d, row in sorted(candidates):
+            vector = self.matrix.vector(row)
+            if all(d < dist(vector, kept) for kept in vectors):
+                selected.append((d, row))
+                vectors.append(vector)
+                if len(selected) == limit:
+                    break
+        return selected
+
+    def _link(self, row: int, layer: int, neighbours: list) -> None:
+        """Links 'row' with 'neighbours' [(distance, row)] in both ways."""
+        limit = 2 * self.M if layer == 0 else self.M
+        self.links[row][layer] = array("I", (n for _, n in neighbours))
+        self.distances[row][layer] = array("d", (d for d, _ in neighbours))
+        for d, neighbour in neighbours:
+            links = self.links[neighbour][layer]
+            distances = self.distances[neighbour][layer]
+            if len(links) < limit:
+                links.append(row)
+                distances.append(d)
+                continue
+            # Full: reselect the links of the neighbour among the old ones
+            # and the new one with the same heuristic (distances are kept
+            # with the links, so only the distances between candidates are
+            # computed)
+            candidates = list(zip(distances, links))
+            candidates.append((d, row))
+            selected = self._select(candidates, limit)
+            self.links[neighbour][layer] = array("I", (n for _, n in selected))
+            self.distances[neighbour][layer] = array(
+                "d", (d for d, _ in selected))
+
+    def add(self, row: int) -> None:
+        """Inserts a row of the matrix (rows must be added in order)."""
+        level = int(-math.log(1.0 - self._random.random())
+                    * self._level_factor)
+        self.links.append([array("I") for _ in range(level + 1)])
+        self.distances.append([array("d") for _ in range(level + 1)])
+        if self.entry is None:
+            self.entry, self._top = row, level
+            return
+
+        vector = self.matrix.vector(row)
+        entries = [(self._distance(vector, self.entry), self.entry)]
+        for layer in range(self._top, level, -1):
+            entries = [min(self._search_layer(vector, entries, 1, layer))]
+        for layer in range(min(level, self._top), -1, -1):
+            found = self._search_layer(vector, entries,
+                                       self.ef_construction, layer)
+            self._link(row, layer, self._select(found, self.M))
+            entries = found
+        if level > self._top:
+            self.entry, self._top = row, level
+
+    def search(self, query: tuple, k: int, exclude: int = None) -> list:
+        """
+        Approximate top-k: [(score, row)] from most to least similar
+        ('exclude' is skipped).
+        """
+        if self.entry is None or k <= 0:
+            return []
+        entries = [(self._distance(query, self.entry), self.entry)]
+        for layer in range(self._top, 0, -1):
+            entries = [min(self._search_layer(query, entries, 1, layer))]
+        wanted = k + (exclude is not None)
+        found = self._search_layer(query, entries,
+                                   max(self.ef_search, wanted), 0)
+        rows = [row for _, row in heapq.nsmallest(wanted, found)
+                if row != exclude][:k]
+        scores = self.matrix.dot_rows(query, rows)
+        return sorted(zip(scores, rows), key=lambda item: (-item[0], item[1]))
@@ -0,0 +1,114 @@
+"""
+IVFIndex.py - Inverted-file (IVF) approximate nearest neighbour index
+
+A coarse quantizer (spherical k-means over the normalized image embeddings)
+splits the collection into 'nlist' clusters and keeps an inverted list of
+rows per centroid. A query is only compared with the rows of the 'nprobe'
+clusters whose centroids are most similar to it, so each query scans about
+nprobe / nlist of the collection instead of all of it.
+
+Tuning: a larger nprobe gives higher recall at proportionally higher cost;
+nprobe = nlist is exact search. nprobe can be changed at any time without
+rebuilding the index (see RecommenderSystem.evaluate to measure recall).
+"""
+
+import heapq
+import math
+import random
+from array import array
+
+from EmbeddingMatrix import EmbeddingMatrix
+
+
+class IVFIndex:
+    """
+    Inverted lists of rows per k-means centroid.
+
+    Attributes:
+        nlist: Number of clusters (inverted lists)
+        nprobe: Number of clusters scanned per query
+        centroids: Normalized centroids (tuples of floats)
+        lists: Rows of each cluster (array of unsigned ints)
+    """
+
+    def __init__(self, matrix: EmbeddingMatrix, nlist: int = None,
+                 nprobe: int = 8, iterations: int = 10,
+                 sample_per_list: int = 32, seed: int = 0):
+        """
+        Trains the quantizer and fills the inverted lists.
+
+        Args:
+            matrix: Normalized embeddings to index
+            nlist: Number of clusters (default: about sqrt(N))
+            nprobe: Clusters scanned per query
+            iterations: k-means iterations
+            sample_per_list: k-means is trained on at most
+                             nlist * sample_per_list random rows
+            seed: Seed of the random sample and initial centroids
+        """
+        self.matrix = matrix
+        count = len(matrix)
+        if nlist is None:
+            nlist = round(math.sqrt(count))
+        self.nlist = max(1, min(nlist, count))
+        self.nprobe = nprobe
+        self.centroids = self._train(iterations, sample_per_list,
+                                     random.Random(seed)) if count else []
+        self.lists = [array("I") for _ in self.centroids]
+        block = 256
+        for start in range(0, count, block):
+            for row, vector in enumerate(matrix.rows(start, start + block),
+                                         start):
+                self.lists[self._nearest(vector)].append(row)
+
+    def _nearest(self, vector: tuple) -> int:
+        """Cluster of the centroid closest to a normalized vector."""
+        dist = math.dist
+        distances = [dist(vector, centroid) for centroid in self.centroids]
+        return distances.index(min(distances))
+
+    def _train(self, iterations: int, sample_per_list: int, rnd) -> list:
+        """Spherical k-means on a random sample of rows."""
+        matrix = self.matrix
+        rows = range(len(matrix))
+        size = min(len(matrix), self.nlist * sample_per_list)
+        points = [matrix.vector(row) for row in sorted(rnd.sample(rows, size))]
+        self.centroids = rnd.sample(points, self.nlist)
+        for _ in range(iterations):
+            members = [[] for _ in self.centroids]
+            for point in points:
+                members[self._nearest(point)].append(point)
+            centroids = []
+            for cluster in members:
+                if not cluster:
+                    # Empty cluster: restart it from a random point
+                    centroids.append(rnd.choice(points))
+                    continue
+                mean = [math.fsum(column) for column in zip(*cluster)]
+                centroids.append(tuple(EmbeddingMatrix.normalize(mean)))
+            if centroids == self.centroids:
+                break
+            self.centroids = centroids
+        return self.centroids
+
+    def add(self, row: int) -> None:
+        """Indexes a row appended to the matrix after the index was built."""
+        self.lists[self._nearest(self.matrix.vector(row))].append(row)
+
+    def search(self, query: tuple, k: int, exclude: int = None) -> list:
+        """
+        Approximate top-k: [(score, row)] from most to least similar,
+        scanning the 'nprobe' closest clusters ('exclude' is skipped).
+        """
+        if not self.centroids or k <= 0:
+            return []
+        dist = math.dist
+        distances = [dist(query, centroid) for centroid in self.centroids]
+        probes = heapq.nsmallest(self.nprobe, range(len(distances)),
+                                 key=distances.__getitem__)
+        rows = [row for cluster in probes for row in self.lists[cluster]
+                if row != exclude]
+        scores = self.matrix.dot_rows(query, rows)
+        best = heapq.nlargest(k, range(len(rows)),
+                              key=lambda i: (scores[i], -rows[i]))
+        return [(scores[i], rows[i]) for i in best]
@@ -0,0 +1,129 @@
+"""
+LSHIndex.py - Random-hyperplane (sign random projection) LSH index
+
+Each normalized embedding gets a signature of 'nbits' bits: bit j is set if
+the embedding lies on the positive side of the j-th random hyperplane. The
+probability that two vectors disagree on a bit is angle / pi, so the Hamming
+distance between signatures estimates the angle between the vectors.
+Signatures are Python ints, and the Hamming distance is
+(a ^ b).bit_count(): one C operation per candidate.
+
+A query ranks the candidates by Hamming distance and reranks the best
+'rerank' of them with the exact cosine similarity. The candidates are all
+the rows or, with tables > 0, only the rows that share at least one band of
+'band_bits' bits with the query (multi-table buckets).
+
+Building costs nbits dot products per row (linear in N, no k-means or graph
+construction), which makes it the cheapest index to build.
+"""
+
+import heapq
+import math
+import random
+from array import array
+
+from EmbeddingMatrix import EmbeddingMatrix
+
+
+class LSHIndex:
+    """
+    Bit signatures of the rows of an EmbeddingMatrix.
+
+    Attributes:
+        nbits: Bits per signature (number of hyperplanes)
+        rerank: Candidates reranked with the exact cosine per query
+        tables: Number of bucket tables (0: rank every row by Hamming)
+        band_bits: Bits of the signature used as key by each table
+        signatures: Signature of each row (int)
+    """
+
+    def __init__(self, matrix: EmbeddingMatrix, nbits: int = 128,
+                 rerank: int = 256, tables: int = 0, band_bits: int = 8,
+                 seed: int = 0):
+        """
+        Args:
+            matrix: Normalized embeddings to index
+            nbits: Bits per signature
+            rerank: Candidates reranked with the exact cosine per query
+            tables: Bucket tables (each uses band_bits bits of the
+                    signature, so tables * band_bits <= nbits); 0 to rank
+                    every row by Hamming distance
+            band_bits: Bits of each table key
+            seed: Seed of the random hyperplanes
+        """
+        if tables * band_bits > nbits:
+            raise ValueError(f"{tables} tables of {band_bits} bits need "
+                             f"more than {nbits} bits")
+        self.matrix = matrix
+        self.nbits = nbits
+        self.rerank = rerank
+        self.tables = tables
+        self.band_bits = band_bits
+        rnd = random.Random(seed)
+        self._planes = [tuple(EmbeddingMatrix.normalize(
+                            [rnd.gauss(0.0, 1.0) for _ in range(matrix.dim)]))
+                        for _ in range(nbits)]
+        self.signatures = []
+        self._buckets = [{} for _ in range(tables)]
+        block = 256
+        for start in range(0, len(matrix), block):
+            for row, vector in enumerate(matrix.rows(start, start + block),
+                                         start):
+                self._insert(row, vector)
+
+    def signature(self, vector: tuple) -> int:
+        """
+        Signature of a normalized vector. With unit hyperplanes,
+        v . h > 0  <=>  |v - h|^2 < |v|^2 + 1.
+        """
+        dist = math.dist
+        limit = EmbeddingMatrix.norm2(vector) + 1.0
+        bits = 0
+        for bit, plane in enumerate(self._planes):
+            if dist(vector, plane) ** 2 < limit:
+                bits |= 1 << bit
+        return bits
+
+    def _bands(self, signature: int):
+        mask = (1 << self.band_bits) - 1
+        for table in range(self.tables):
+            yield table, (signature >> (table * self.band_bits)) & mask
+
+    def _insert(self, row: int, vector: tuple) -> None:
+        signature = self.signature(vector)
+        self.signatures.append(signature)
+        for table, key in self._bands(signature):
+            bucket = self._buckets[table].get(key)
+            if bucket is None:
+                self._buckets[table][key] = array("I", (row,))
+            else:
+                bucket.append(row)
+
+    def add(self, row: int) -> None:
+        """Indexes a row appended to the matrix after the index was built."""
+        self._insert(row, self.matrix.vector(row))
+
+    def search(self, query: tuple, k: int, exclude: int = None) -> list:
+        """
+        Approximate top-k: [(score, row)] from most to least similar
+        ('exclude' is skipped).
+        """
+        if not self.signatures or k <= 0:
+            return []
+        signature = self.signature(query)
+        signatures = self.signatures
+        if self.tables:
+            rows = set()
+            for table, key in self._bands(signature):
+                rows.update(self._buckets[table].get(key, ()))
+            rows = sorted(rows)
+        else:
+            rows = range(len(signatures))
+        distances = [(signature ^ signatures[row]).bit_count()
+                     for row in rows]
+        best = heapq.nsmallest(max(self.rerank, k + 1), range(len(rows)),
+                               key=distances.__getitem__)
+        candidates = [rows[i] for i in best if rows[i] != exclude]
+        scores = self.matrix.dot_rows(query, candidates)
+        return heapq.nlargest(k, zip(scores, candidates),
+                              key=lambda item: (item[0], -item[1]))
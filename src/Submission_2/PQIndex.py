@@ -0,0 +1,229 @@
+"""
+PQIndex.py - Product quantization (PQ) of the image embeddings
+
+Each normalized embedding is split into M sub-vectors of dim / M values, and
+each sub-vector is replaced by the number (one byte) of its closest centroid
+in a codebook of 256 centroids trained with k-means for that sub-space. A
+512-value float32 embedding (2048 bytes) becomes M bytes.
+
+Queries use asymmetric distance computation (ADC): the query is not
+quantized; for every sub-space a table with the dot product of the query
+sub-vector with each of the 256 centroids is computed once, and the
+approximate similarity of a row is the sum of M table lookups. Optionally
+the best 'rerank' rows are rescored with the exact cosine, reading the
+original vectors from the VectorStore.
+
+The index is built block by block straight from the VectorStore, so the
+dense normalized matrix of exact search is never built. The resident memory
+is then the codes, the codebooks and whatever the store keeps in RAM: a
+binary store is memory-mapped (its pages stay on disk until read), but a
+store loaded from JSON keeps its float32 matrices in memory, so PQ only
+shrinks the resident size with a binary store (see VectorStore.convert).
+
+The codes are stored by sub-space (one bytearray of N codes per sub-space),
+so that scoring walks each table over a contiguous column with map().
+"""
+
+import heapq
+import math
+import random
+import sys
+from array import array
+from operator import add
+
+from EmbeddingMatrix import EmbeddingMatrix
+
+
+class PQIndex:
+    """
+    Product-quantized codes of the image embeddings of a VectorStore.
+
+    Attributes:
+        store: VectorStore with the original vectors
+        M: Number of sub-spaces (bytes per row)
+        rerank: Rows rescored with the exact cosine per query (0: none)
+        codebooks: codebooks[m] -> 256 centroids (tuples) of sub-space m
+        codes: codes[m] -> bytearray with the code of each row in sub-space m
+    """
+
+    # Built from the VectorStore instead of the normalized EmbeddingMatrix,
+    # which RecommenderSystem then does not build
+    REPLACES_MATRIX = True
+
+    CENTROIDS = 256
+
+    def __init__(self, store, M: int = 32, rerank: int = 0,
+                 iterations: int = 6, sample: int = 1024, seed: int = 0):
+        """
+        Trains the codebooks and encodes every image embedding of 'store',
+        normalizing them by blocks of rows.
+
+        Args:
+            store: VectorStore with the original vectors (kept for rerank,
+                   add() and the query vectors)
+            M: Number of sub-spaces; must divide the embedding length
+            rerank: Rows rescored with the exact cosine per query
+            iterations: k-means iterations per sub-space
+            sample: Rows used to train the codebooks
+            seed: Seed of the training sample and initial centroids
+        """
+        dim = store.image_dim
+        if M <= 0 or dim % M:
+            raise ValueError(f"M={M} must divide the embedding length {dim}")
+        self.store = store
+        self.M = M
+        self.rerank = rerank
+        self._sub = dim // M
+        self._count = len(store)
+        rnd = random.Random(seed)
+        rows = sorted(rnd.sample(range(self._count),
+                                 min(sample, self._count) if dim else 0))
+        # Normalized training sample as one flat float32 array (tuples of
+        # Python floats would take 8 times more); each sub-space only
+        # unpacks its own columns
+        points = array("f")
+        for row in rows:
+            points.extend(self._rows(row, row + 1)[0])
+        self.codebooks = [self._train(points, m, iterations, rnd)
+                          for m in range(M)]
+        self._norms2 = [[EmbeddingMatrix.norm2(c) for c in codebook]
+                        for codebook in self.codebooks]
+        self.codes = [bytearray() for _ in range(M)]
+        # An empty store (or one without image embeddings) has nothing to
+        # train on: the index then scores every row with the exact cosine
+        self._trained = bool(points)
+        if not self._trained:
+            return
+        # Small blocks: a normalized row unpacked to Python floats takes
+        # 8 times its float32 size
+        block = 32
+        for start in range(0, self._count, block):
+            for vector in self._rows(start, start + block):
+                self._encode(vector)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _rows(self, start: int, stop: int) -> list:
+        """Normalized image embeddings of rows [start, stop) as tuples."""
+        dim = self.store.image_dim
+        values = self.store.image[start * dim:stop * dim].tolist()
+        return [tuple(EmbeddingMatrix.normalize(values[i:i + dim]))
+                for i in (range(0, len(values), dim) if dim else ())]
+
+    def _split(self, vector: tuple, m: int) -> tuple:
+        return vector[m * self._sub:(m + 1) * self._sub]
+
+    @staticmethod
+    def _nearest(vector: tuple, codebook: list) -> int:
+        distances = list(map(math.dist, [vector] * len(codebook), codebook))
+        return distances.index(min(distances))
+
+    def _train(self, points: array, m: int, iterations: int, rnd) -> list:
+        """
+        k-means with (at most) 256 centroids on sub-space m of the flat
+        sample 'points'.
+        """
+        dim = self.M * self._sub
+        start = m * self._sub
+        subs = [tuple(points[i + start:i + start + self._sub])
+                for i in (range(0, len(points), dim) if dim else ())]
+        codebook = rnd.sample(subs, min(self.CENTROIDS, len(subs)))
+        for _ in range(iterations):
+            members = [[] for _ in codebook]
+            for sub in subs:
+                members[self._nearest(sub, codebook)].append(sub)
+            codebook = [tuple(math.fsum(column) / len(cluster)
+                              for column in zip(*cluster))
+                        if cluster else rnd.choice(subs)
+                        for cluster in members]
+        return codebook
+
+    def _encode(self, vector: tuple) -> None:
+        for m, codebook in enumerate(self.codebooks):
+            self.codes[m].append(self._nearest(self._split(vector, m),
+                                               codebook))
+
+    def add(self, row: int) -> None:
+        """Encodes a row appended to the store after the index was built."""
+        if self._trained:
+            self._encode(self._rows(row, row + 1)[0])
+        self._count += 1
+
+    def _scores(self, query: tuple) -> list:
+        """Approximate dot products of 'query' with every row (ADC)."""
+        dist = math.dist
+        scores = None
+        for m, (codebook, norms2) in enumerate(zip(self.codebooks,
+                                                   self._norms2)):
+            sub = self._split(query, m)
+            sub2 = EmbeddingMatrix.norm2(sub)
+            table = [(sub2 + norm2 - dist(sub, centroid) ** 2) / 2
+                     for norm2, centroid in zip(norms2, codebook)]
+            column = map(table.__getitem__, self.codes[m])
+            scores = list(column) if scores is None else \
+                list(map(add, scores, column))
+        return scores
+
+    def _exact(self, query: tuple, rows: list) -> list:
+        """Exact cosine of 'query' with the original vectors of 'rows'."""
+        dim = self.store.image_dim
+        image = self.store.image
+        dist = math.dist
+        query2 = EmbeddingMatrix.norm2(query)
+        scores = []
+        for row in rows:
+            vector = tuple(image[row * dim:(row + 1) * dim])
+            norm = math.hypot(*vector)
+            scores.append((query2 + norm * norm - dist(query, vector) ** 2)
+                          / (2 * norm) if norm else 0.0)
+        return scores
+
+    def search(self, query: tuple, k: int, exclude: int = None) -> list:
+        """
+        Approximate top-k: [(score, row)] from most to least similar
+        ('exclude' is skipped).
+        """
+        if not self._count or k <= 0:
+            return []
+        if not self._trained:
+            scores = self._exact(query, range(self._count))
+            return heapq.nlargest(k, ((score, row) for row, score
+                                      in enumerate(scores) if row != exclude),
+                                  key=lambda item: (item[0], -item[1]))
+        scores = self._scores(query)
+        if exclude is not None:
+            scores[exclude] = -math.inf
+        rows = heapq.nlargest(max(k, self.rerank), range(len(scores)),
+                              key=scores.__getitem__)
+        rows = [row for row in rows if row != exclude]
+        if self.rerank:
+            scores = dict(zip(rows, self._exact(query, rows)))
+        return heapq.nlargest(k, ((scores[row], row) for row in rows),
+                              key=lambda item: (item[0], -item[1]))
+
+    def memory_report(self) -> dict:
+        """
+        Resident bytes of the index and of the store it reads from, against
+        exact search (the store plus the dense normalized float32 matrix).
+
+        Returns:
+            {"codes", "codebooks": bytes of the index,
+             "store": bytes of store matrices held in RAM (0 if mapped),
+             "mapped": bytes of store matrices mapped from disk,
+             "resident": codes + codebooks + store,
+             "exact": store + dense matrix (preprocess() without index),
+             "saved": exact - resident, "ratio": exact / resident}
+        """
+        codes = sum(len(column) for column in self.codes)
+        codebooks = sum(sys.getsizeof(centroid) + 24 * len(centroid)
+                        for codebook in self.codebooks
+                        for centroid in codebook)
+        mapped = self.store.nbytes if self.store.mapped else 0
+        store = self.store.nbytes - mapped
+        resident = codes + codebooks + store
+        exact = store + 4 * self._count * self.M * self._sub
+        return {"codes": codes, "codebooks": codebooks, "store": store,
+                "mapped": mapped, "resident": resident, "exact": exact,
+                "saved": exact - resident,
+                "ratio": exact / resident if resident else 1.0}
@@ -16,8 +16,17 @@ Phases:
 - Phase 3: find_transition_prompts() - Find path connecting two images
 """
 
-import json
-from datetime import datetime
+import heapq
+import math
+import time
+
+from EmbeddingMatrix import EmbeddingMatrix
+from Gallery import Gallery
+from HNSWIndex import HNSWIndex
+from IVFIndex import IVFIndex
+from LSHIndex import LSHIndex
+from PQIndex import PQIndex
+from VectorStore import VectorStore
 
 
 class RecommenderSystem:
@@ -27,8 +36,18 @@ class RecommenderSystem:
     Attributes:
         
         vectors_path: Path to the JSON file containing CLIP vectors
+        vectors: VectorStore with the image/text embeddings (float32 rows)
     """
 
+    # Rows of the matrix unpacked per block by exact batch search (_exact_top)
+    BLOCK_ROWS = 256
+    # Queries scored together against each block by find_similar_images_batch
+    QUERY_TILE = 256
+
+    # Approximate indexes that preprocess() can build (exact search if None)
+    INDEXES = {"ivf": IVFIndex, "hnsw": HNSWIndex, "lsh": LSHIndex,
+               "pq": PQIndex}
+
     def __init__(self, vectors_path: str, image_data=None, image_id=None):
         """
         Initialize the recommender system by loading CLIP vectors.
@@ -36,14 +55,20 @@ class RecommenderSystem:
         Args:
             vectors_path: Path to JSON file with CLIP embeddings
                          Format: {"uuid": {"image_embedding": [...], "text_embedding": [...]}, ...}
+                         or to a binary store written by VectorStore.save()
+                         (memory-mapped, see VectorStore.py)
             image_data: (Optional) ImageData instance from Phase 1 for metadata access
             image_id: (Optional) ImageID instance from Phase 1 for UUID mapping
         """
-        # TODO: Load vectors from JSON file
-        # Structure should be: self.vectors = {uuid: {image_embedding: [...], text_embedding: [...]}}
-        pass
-
-    def preprocess(self):
+        self.vectors_path = vectors_path
+        self.image_data = image_data
+        self.image_id = image_id
+        self.vectors = VectorStore.load(vectors_path)
+        self._matrix = None     # EmbeddingMatrix (normalized image embeddings)
+        self._index = None      # approximate index, None for exact search
+        self._preprocessed = False
+
+    def preprocess(self, index: str = None, **params):
         """
         Preprocess and prepare data structures for efficient queries.
 
@@ -51,10 +76,62 @@ class RecommenderSystem:
         Use it to build indexes or prepare other data structures
         that will speed up similarity computations.
 
-        """
-        # TODO: Implement preprocessing
-        pass
+        Builds one contiguous float32 matrix with the L2-normalized image
+        embeddings (same rows as self.vectors, so self.vectors.row(uuid)
+        is the uuid -> row map): the cosine similarity of two images is
+        then a single dot product (see EmbeddingMatrix).
 
+        Args:
+            index: (Optional) Approximate index used by find_similar_images,
+                   one of INDEXES ("ivf", "hnsw", "lsh", "pq"); None for
+                   exact search
+            **params: Parameters of the index (e.g. nlist=100, nprobe=8
+                      for "ivf"; M=12, ef_construction=64, ef_search=32
+                      for "hnsw"; nbits=128, rerank=256 for "lsh";
+                      M=32, rerank=0 for "pq")
+
+        An index with REPLACES_MATRIX (product quantization) is built from
+        self.vectors and keeps compressed codes instead of the normalized
+        matrix, which is not built; query vectors are normalized from
+        self.vectors when needed. It only shrinks the resident memory with
+        a memory-mapped binary store (see PQIndex.memory_report).
+        """
+        if index is not None and index not in self.INDEXES:
+            raise ValueError(f"Unknown index {index!r}, expected one of "
+                             f"{sorted(self.INDEXES)}")
+        store = self.vectors
+        cls = self.INDEXES.get(index)
+        self._matrix = None
+        self._index = None
+        self._preprocessed = True
+        if getattr(cls, "REPLACES_MATRIX", False):
+            self._index = cls(store, **params)
+            return
+        self._matrix = EmbeddingMatrix(store.image, store.image_dim)
+        if cls is not None:
+            self._index = cls(self._matrix, **params)
+
+    def add_vector(self, uuid: str, image_embedding,
+                   text_embedding=None) -> None:
+        """
+        Adds the embeddings of a new image. If preprocess() has already run,
+        the normalized matrix and the index are updated incrementally.
+        """
+        row = self.vectors.add(uuid, image_embedding, text_embedding)
+        if self._matrix is not None:
+            self._matrix.append(self.vectors.image_embedding(uuid))
+        if self._index is not None:
+            self._index.add(row)
+
+    def _query_vector(self, uuid: str):
+        """Normalized image embedding of a uuid as a tuple, or None."""
+        row = self.vectors.row(uuid)
+        if row is None:
+            return None
+        if self._matrix is None:
+            vector = self.vectors.image_embedding(uuid)
+            return tuple(EmbeddingMatrix.normalize(vector))
+        return self._matrix.vector(row)
 
     @staticmethod
     def cosine_similarity(vec_a, vec_b):
@@ -114,19 +191,141 @@ class RecommenderSystem:
         - Metric: Recall@100 (your top-10 vs ground truth top-100)
         - Timing: Tested on 1,000 queries
         - Scoring: 25 pts for precision + 15 pts for speed
+        """
+        gallery = Gallery()
+        if not self._preprocessed:
+            self.preprocess()
+        query = self._query_vector(query_uuid)
+        if not query:
+            # Unknown uuid, or a store without image embeddings (dim 0)
+            return gallery
+
+        uuids = self.vectors.uuids
+        query_row = self.vectors.row(query_uuid)
+        if self._index is not None:
+            gallery.images = [uuids[row] for _, row in
+                              self._index.search(query, k, exclude=query_row)]
+            return gallery
+
+        scores = self._matrix.dot(query)
+        scores[query_row] = -math.inf
+        best = heapq.nlargest(k, range(len(scores)), key=scores.__getitem__)
+        gallery.images = [uuids[row] for row in best if scores[row] > -math.inf]
+        return gallery
 
+    def find_similar_images_batch(self, query_uuids, k: int = 10) -> list:
+        """
+        Find the k most similar images to each of many query images.
 
-        TODO: Implement this method
+        Returns the same Galleries as calling find_similar_images(q, k) for
+        each q, in order. With exact search this is much faster in bulk:
+        queries are processed in tiles of QUERY_TILE against blocks of
+        BLOCK_ROWS rows of the normalized matrix. Each block is unpacked to
+        Python floats once per tile and reused by every query in the tile,
+        and each query keeps only a bounded heap of its k best rows instead
+        of sorting all scores.
+
+        Args:
+            query_uuids: Iterable of query image UUIDs
+            k: Number of similar images to return per query
+
+        Returns:
+            List of Gallery objects, one per query (empty if the UUID is
+            unknown)
         """
-        # TODO:
-        # 1. Get query vector from self.vectors
-        # 2. Calculate similarity to other images (use cosine_similarity)
-        # 3. Sort by similarity (descending)
-        # 4. Create and return Gallery with top-k images
+        if not self._preprocessed:
+            self.preprocess()
+        query_uuids = list(query_uuids)
+        if self._index is not None:
+            return [self.find_similar_images(uuid, k) for uuid in query_uuids]
+
+        galleries = []
+        uuids = self.vectors.uuids
+        for rows in self._exact_top(query_uuids, k):
+            gallery = Gallery()
+            if rows is not None:
+                gallery.images = [uuids[row] for row in rows]
+            galleries.append(gallery)
+        return galleries
+
+    def _exact_top(self, query_uuids: list, k: int) -> list:
+        """
+        Exact top-k rows of each query (None for unknown UUIDs), computed
+        by tiles of queries against blocks of rows.
+        """
+        store = self.vectors
+        matrix = self._matrix
+        if matrix is None:
+            # Not built with a compressed index: build it for this computation
+            matrix = EmbeddingMatrix(store.image, store.image_dim)
+        count = len(matrix)
+        results = [None] * len(query_uuids)
+        heappush, heappushpop = heapq.heappush, heapq.heappushpop
+        for tile in range(0, len(query_uuids), self.QUERY_TILE):
+            queries = []            # [(position, row, vector, heap)]
+            for position in range(tile, min(len(query_uuids),
+                                             tile + self.QUERY_TILE)):
+                uuid = query_uuids[position]
+                vector = self._query_vector(uuid)
+                if vector is not None:
+                    queries.append((position, store.row(uuid), vector, []))
+
+            for block in range(0, count if queries and k > 0 else 0,
+                               self.BLOCK_ROWS):
+                end = min(count, block + self.BLOCK_ROWS)
+                rows = matrix.rows(block, end)
+                norms2 = matrix.norms2[block:end]
+                for _, query_row, vector, heap in queries:
+                    scores = matrix.dot_vectors(vector, rows, norms2)
+                    if block <= query_row < end:
+                        scores[query_row - block] = -math.inf
+                    # Ties keep the lower row, as in find_similar_images
+                    floor = heap[0][0] if len(heap) == k else -math.inf
+                    for i, score in enumerate(scores):
+                        if score > floor:
+                            if len(heap) < k:
+                                heappush(heap, (score, -(block + i)))
+                            else:
+                                heappushpop(heap, (score, -(block + i)))
+                            if len(heap) == k:
+                                floor = heap[0][0]
+
+            for position, _, _, heap in queries:
+                results[position] = [-row for _, row in
+                                     sorted(heap, reverse=True)]
+        return results
+
+    def evaluate(self, query_uuids, k: int = 10, gt_k: int = 100) -> dict:
+        """
+        Measures the current engine against exact search, with the metric
+        of the autograder: recall@gt_k is the fraction of the top-k returned
+        by find_similar_images that is in the exact top-gt_k.
 
-        gallery = Gallery()
-        gallery.images = []
-        return gallery
+        Example (choosing nprobe for the IVF index):
+            system.preprocess(index="ivf", nlist=100)
+            for nprobe in (1, 2, 4, 8, 16):
+                system._index.nprobe = nprobe
+                print(nprobe, system.evaluate(queries))
+
+        Returns:
+            {"recall": mean recall@gt_k, "query_time": mean seconds per
+             query, "queries": number of known query UUIDs}
+        """
+        if not self._preprocessed:
+            self.preprocess()
+        query_uuids = [uuid for uuid in query_uuids if uuid in self.vectors]
+        exact = self._exact_top(query_uuids, gt_k)
+        uuids = self.vectors.uuids
+        start = time.perf_counter()
+        results = [self.find_similar_images(uuid, k).images
+                   for uuid in query_uuids]
+        elapsed = time.perf_counter() - start
+        recalls = [len(set(images[:k]) & {uuids[row] for row in rows}) / k
+                   for images, rows in zip(results, exact)]
+        count = len(query_uuids)
+        return {"recall": sum(recalls) / count if count else 0.0,
+                "query_time": elapsed / count if count else 0.0,
+                "queries": count}
 
     def find_transition_prompts(self, uuid_1: str, uuid_2: str) -> list:
         """
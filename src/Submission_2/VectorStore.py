@@ -0,0 +1,343 @@
+"""
+VectorStore.py - Compact storage of the CLIP embeddings used by RecommenderSystem
+
+The embeddings are kept as two contiguous float32 matrices (one row per image:
+image embeddings and text embeddings) plus a uuid table, instead of a dict of
+Python float lists (24+ bytes per float). Rows are read as slices of these
+matrices, so no per-vector Python objects are kept.
+
+Binary format (little endian), written by VectorStore.save():
+
+    offset 0   magic        8 bytes   b"CLIPVEC1"
+    offset 8   count        uint32    number of images (rows)
+    offset 12  image_dim    uint32    length of each image embedding
+    offset 16  text_dim     uint32    length of each text embedding
+    offset 20  table_size   uint32    size in bytes of the uuid table
+    offset 24  uuid table   UTF-8 uuids separated by "\n", zero padded to a
+                            multiple of 4 bytes
+    then       image rows   count * image_dim float32
+    then       text rows    count * text_dim float32
+
+A binary file is memory-mapped and the matrices are memoryviews over the
+mapping (zero copy): opening a store costs milliseconds regardless of its
+size, and pages are only read from disk when they are used.
+
+Usage:
+    python VectorStore.py clip_vectors.json clip_vectors.bin
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+
+_WHITESPACE = " \t\n\r"
+
+
+class _JsonReader:
+    """
+    Minimal incremental reader of a JSON text: keeps only a window of the
+    file in memory (refilled in chunks) and decodes one value at a time.
+    """
+
+    def __init__(self, f, chunk_size: int):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Reads one more chunk; returns False at the end of the file."""
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ("" at the end of the file)."""
+        while True:
+            buffer = self._buffer
+            pos = self._pos
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Invalid vectors file: expected {char!r}")
+        self._pos += 1
+
+    def value(self):
+        """Decodes the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise ValueError(f"Invalid vectors file: {e}") from None
+            # A number at the end of the window may continue in the next one
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def members(self):
+        """
+        Iterates the keys of the object that starts here. The caller must
+        consume the value of each key (with value() or members()) before
+        asking for the next one.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self._pos += 1
+                continue
+            self.expect("}")
+            return
+
+
+class VectorStore:
+    """
+    Image/text embeddings of a collection as contiguous float32 rows.
+
+    Attributes:
+        uuids: List of uuids; the position of a uuid is its row
+        image_dim, text_dim: Length of the image and text embeddings
+        image, text: Flat float32 arrays, or memoryviews over the mapped
+                     file of a binary store (count * dim values)
+    """
+
+    MAGIC = b"CLIPVEC1"
+    HEADER = struct.Struct("<8sIIII")
+
+    def __init__(self, uuids: list, image, text, image_dim: int,
+                 text_dim: int, mapping=None):
+        self.uuids = uuids
+        self.image_dim = image_dim
+        self.text_dim = text_dim
+        self.image = image
+        self.text = text
+        self._rows = {uuid: row for row, uuid in enumerate(uuids)}
+        self._mapping = mapping         # mmap kept alive while in use
+
+    def __len__(self) -> int:
+        return len(self.uuids)
+
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self._rows
+
+    def row(self, uuid: str):
+        """Row of a uuid in the matrices, or None if it is not stored."""
+        return self._rows.get(uuid)
+
+    def image_embedding(self, uuid: str):
+        """Image embedding of a uuid (float32 row), or None."""
+        row = self._rows.get(uuid)
+        if row is None:
+            return None
+        dim = self.image_dim
+        return self.image[row * dim:(row + 1) * dim]
+
+    def text_embedding(self, uuid: str):
+        """Text embedding of a uuid (float32 row), or None."""
+        row = self._rows.get(uuid)
+        if row is None:
+            return None
+        dim = self.text_dim
+        return self.text[row * dim:(row + 1) * dim]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the embedding matrices."""
+        return (len(self.image) + len(self.text)) * self.image.itemsize
+
+    @property
+    def mapped(self) -> bool:
+        """True if the matrices are read from the mapped file (not in RAM)."""
+        return isinstance(self.image, memoryview)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorStore":
+        """Opens a binary store, or parses a JSON vectors file."""
+        with open(path, "rb") as f:
+            magic = f.read(len(cls.MAGIC))
+        if magic == cls.MAGIC:
+            return cls.open_binary(path)
+        return cls.from_json(path)
+
+    @classmethod
+    def from_json(cls, path: str, chunk_size: int = 1 << 20) -> "VectorStore":
+        """
+        Reads a JSON vectors file:
+        {"uuid": {"image_embedding": [...], "text_embedding": [...]}, ...},
+        optionally wrapped as {"vectors": {...}}.
+
+        The file is parsed incrementally (see iter_json), so the whole
+        nested dict of Python lists never exists in memory: peak memory is
+        the packed matrices plus one chunk and one entry.
+        """
+        return cls.from_items(cls.iter_json(path, chunk_size))
+
+    @staticmethod
+    def iter_json(path: str, chunk_size: int = 1 << 20):
+        """
+        Yields the (uuid, entry) pairs of a JSON vectors file one at a time,
+        reading it in chunks of 'chunk_size' characters.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            reader = _JsonReader(f, chunk_size)
+            for key in reader.members():
+                if key == "vectors" and reader.peek() == "{":
+                    for uuid in reader.members():
+                        yield uuid, reader.value()
+                    continue
+                entry = reader.value()
+                if isinstance(entry, dict) and "image_embedding" in entry:
+                    yield key, entry
+
+    @classmethod
+    def from_items(cls, items) -> "VectorStore":
+        """Packs (uuid, {"image_embedding": [...], ...}) pairs into rows."""
+        uuids = []
+        image = array("f")
+        text = array("f")
+        image_dim = text_dim = None
+        for uuid, entry in items:
+            vector = entry.get("image_embedding") or []
+            if image_dim is None:
+                image_dim = len(vector)
+            if len(vector) != image_dim:
+                raise ValueError(f"image_embedding of {uuid} has {len(vector)}"
+                                 f" values, expected {image_dim}")
+            words = entry.get("text_embedding") or []
+            if words and text_dim is None:
+                # Rows read before the first text embedding get zeros
+                text_dim = len(words)
+                text.extend((0.0,) * (len(uuids) * text_dim))
+            if text_dim is not None and not words:
+                words = (0.0,) * text_dim
+            if len(words) != (text_dim or 0):
+                raise ValueError(f"text_embedding of {uuid} has {len(words)}"
+                                 f" values, expected {text_dim}")
+            uuids.append(uuid)
+            image.extend(vector)
+            text.extend(words)
+        return cls(uuids, image, text, image_dim or 0, text_dim or 0)
+
+    @classmethod
+    def open_binary(cls, path: str) -> "VectorStore":
+        """Memory-maps a binary store written by save()."""
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, image_dim, text_dim, table_size = \
+            cls.HEADER.unpack_from(mapping, 0)
+        if magic != cls.MAGIC:
+            mapping.close()
+            raise ValueError(f"{path} is not a vector store")
+        offset = cls.HEADER.size
+        table = bytes(mapping[offset:offset + table_size]).rstrip(b"\0")
+        uuids = table.decode("utf-8").split("\n") if count else []
+        if len(uuids) != count:
+            mapping.close()
+            raise ValueError(f"{path}: corrupted uuid table")
+        offset += table_size
+        image_end = offset + 4 * count * image_dim
+        text_end = image_end + 4 * count * text_dim
+        if len(mapping) < text_end:
+            mapping.close()
+            raise ValueError(f"{path}: truncated vector store")
+        view = memoryview(mapping)
+        image = view[offset:image_end].cast("f")
+        text = view[image_end:text_end].cast("f")
+        if sys.byteorder != "little":
+            # The file is little endian: swap into memory on big endian hosts
+            image, text = array("f", image), array("f", text)
+            image.byteswap()
+            text.byteswap()
+        return cls(uuids, image, text, image_dim, text_dim, mapping)
+
+    def save(self, path: str) -> None:
+        """Writes the store in the binary format described above."""
+        table = "\n".join(self.uuids).encode("utf-8")
+        table += b"\0" * (-len(table) % 4)
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, len(self.uuids),
+                                     self.image_dim, self.text_dim,
+                                     len(table)))
+            f.write(table)
+            for matrix in (self.image, self.text):
+                if sys.byteorder != "little":
+                    matrix = array("f", matrix)
+                    matrix.byteswap()
+                f.write(matrix)
+
+    def add(self, uuid: str, image_embedding, text_embedding=None) -> int:
+        """
+        Appends the embeddings of a new uuid and returns its row. A mapped
+        binary store is first copied into memory (the file is read-only).
+        """
+        if uuid in self._rows:
+            raise ValueError(f"uuid {uuid} already in the vector store")
+        if len(image_embedding) != self.image_dim:
+            raise ValueError(f"image_embedding of {uuid} has "
+                             f"{len(image_embedding)} values, expected "
+                             f"{self.image_dim}")
+        if not text_embedding:
+            text_embedding = (0.0,) * self.text_dim
+        if len(text_embedding) != self.text_dim:
+            raise ValueError(f"text_embedding of {uuid} has "
+                             f"{len(text_embedding)} values, expected "
+                             f"{self.text_dim}")
+        if not isinstance(self.image, array):
+            self.image = array("f", self.image)
+            self.text = array("f", self.text)
+        self.image.extend(image_embedding)
+        self.text.extend(text_embedding)
+        self._rows[uuid] = len(self.uuids)
+        self.uuids.append(uuid)
+        return self._rows[uuid]
+
+    def close(self) -> None:
+        """Releases the memory mapping (the store can't be used afterwards)."""
+        for matrix in (self.image, self.text):
+            if isinstance(matrix, memoryview):
+                matrix.release()
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                pass    # rows still referenced: unmapped when collected
+            self._mapping = None
+
+
+def convert(json_path: str, binary_path: str) -> None:
+    """Converts a JSON vectors file into a binary store."""
+    VectorStore.from_json(json_path).save(binary_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python VectorStore.py <vectors.json> <vectors.bin>")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
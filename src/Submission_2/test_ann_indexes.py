@@ -0,0 +1,117 @@
+"""
+test_ann_indexes.py - Recall of IVFIndex, LSHIndex and PQIndex against
+exact search
+
+Run with:  python -m pytest test_ann_indexes.py   or   python test_ann_indexes.py
+
+Each index is built on the first rows of a clustered collection; the rest
+are added afterwards with add(), as RecommenderSystem.add_vector() does.
+The recall is the fraction of the exact top-k (by cosine) that the index
+returns, averaged over a third of the rows used as queries.
+"""
+
+import heapq
+import os
+import random
+import sys
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from EmbeddingMatrix import EmbeddingMatrix
+from IVFIndex import IVFIndex
+from LSHIndex import LSHIndex
+from PQIndex import PQIndex
+from VectorStore import VectorStore
+
+COUNT = 600
+BUILT = 500     # rows indexed when the index is built; the rest are added
+DIM = 64
+K = 10
+
+
+def _store(seed: int = 1) -> VectorStore:
+    rnd = random.Random(seed)
+    centres = [[rnd.gauss(0.0, 1.0) for _ in range(DIM)] for _ in range(12)]
+    uuids = []
+    image = array("f")
+    for i in range(COUNT):
+        uuids.append(f"uuid-{i}")
+        image.extend(x + rnd.gauss(0.0, 1.0) for x in centres[i % 12])
+    return VectorStore(uuids, image, array("f"), DIM, 0)
+
+
+def _recall(index, matrix: EmbeddingMatrix, add) -> float:
+    for row in range(BUILT, COUNT):
+        add(row)
+    found = total = 0
+    for query_row in range(0, COUNT, 3):
+        query = matrix.vector(query_row)
+        scores = matrix.dot(query)
+        scores[query_row] = -2.0
+        exact = set(heapq.nlargest(K, range(len(scores)),
+                                   key=scores.__getitem__))
+        result = index.search(query, K, exclude=query_row)
+        rows = [row for _, row in result]
+        assert query_row not in rows
+        assert [score for score, _ in result] == \
+            sorted((score for score, _ in result), reverse=True)
+        found += len(set(rows) & exact)
+        total += K
+    return found / total
+
+
+def _matrix(store: VectorStore, rows: int) -> EmbeddingMatrix:
+    return EmbeddingMatrix(store.image[:rows * DIM], DIM)
+
+
+def test_ivf_recall():
+    store = _store()
+    matrix = _matrix(store, BUILT)
+    index = IVFIndex(matrix, nlist=12, nprobe=4)
+
+    def add(row):
+        index.add(matrix.append(store.image[row * DIM:(row + 1) * DIM]))
+
+    assert _recall(index, matrix, add) >= 0.95
+
+
+def test_lsh_recall():
+    store = _store()
+    matrix = _matrix(store, BUILT)
+    index = LSHIndex(matrix, nbits=128, rerank=100)
+
+    def add(row):
+        index.add(matrix.append(store.image[row * DIM:(row + 1) * DIM]))
+
+    assert _recall(index, matrix, add) >= 0.95
+
+
+def _pq_recall(rerank: int) -> float:
+    store = _store()
+    full = _matrix(store, COUNT)
+    # PQIndex reads the rows of the store: it starts with the first BUILT
+    built = VectorStore(store.uuids[:BUILT], store.image[:BUILT * DIM],
+                        array("f"), DIM, 0)
+    index = PQIndex(built, M=16, rerank=rerank)
+
+    def add(row):
+        built.add(store.uuids[row], store.image[row * DIM:(row + 1) * DIM])
+        index.add(row)
+
+    recall = _recall(index, full, add)
+    assert index.memory_report()["codes"] == COUNT * 16
+    return recall
+
+
+def test_pq_recall():
+    # The codes alone (ADC scores) and with the exact rerank of the best rows
+    assert _pq_recall(rerank=0) >= 0.7
+    assert _pq_recall(rerank=50) >= 0.95
+
+
+if __name__ == "__main__":
+    test_ivf_recall()
+    test_lsh_recall()
+    test_pq_recall()
+    print("OK")
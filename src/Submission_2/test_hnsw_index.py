@@ -0,0 +1,72 @@
+"""
+test_hnsw_index.py - HNSWIndex on clustered vectors
+
+Run with:  python -m pytest test_hnsw_index.py   or   python test_hnsw_index.py
+
+With tight clusters, a graph that links every node only to its closest
+neighbours loses all the links between clusters, and the clusters that the
+entry point does not belong to cannot be reached on layer 0 whatever the
+value of ef_search.
+"""
+
+import heapq
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from EmbeddingMatrix import EmbeddingMatrix
+from HNSWIndex import HNSWIndex
+
+
+def _clustered(count: int = 600, dim: int = 64, clusters: int = 12,
+               noise: float = 0.05, seed: int = 1) -> EmbeddingMatrix:
+    rnd = random.Random(seed)
+    centres = [[rnd.gauss(0.0, 1.0) for _ in range(dim)]
+               for _ in range(clusters)]
+    vectors = []
+    for i in range(count):
+        centre = centres[i % clusters]
+        vectors.extend(x + rnd.gauss(0.0, noise) for x in centre)
+    return EmbeddingMatrix(vectors, dim)
+
+
+def _reachable(index: HNSWIndex) -> set:
+    """Rows reachable on layer 0 from the entry point."""
+    seen = {index.entry}
+    stack = [index.entry]
+    while stack:
+        for neighbour in index.links[stack.pop()][0]:
+            if neighbour not in seen:
+                seen.add(neighbour)
+                stack.append(neighbour)
+    return seen
+
+
+def test_layer0_connected():
+    matrix = _clustered()
+    index = HNSWIndex(matrix, M=12)
+    assert len(_reachable(index)) == len(matrix)
+
+
+def test_recall_on_clusters():
+    matrix = _clustered()
+    index = HNSWIndex(matrix, M=12, ef_search=64)
+    k = 10
+    found = 0
+    for query_row in range(0, len(matrix), 3):
+        query = matrix.vector(query_row)
+        scores = matrix.dot(query)
+        scores[query_row] = -2.0
+        exact = set(heapq.nlargest(k, range(len(scores)),
+                                   key=scores.__getitem__))
+        rows = {row for _, row in index.search(query, k, exclude=query_row)}
+        found += len(rows & exact)
+    assert found / (k * len(range(0, len(matrix), 3))) >= 0.95
+
+
+if __name__ == "__main__":
+    test_layer0_connected()
+    test_recall_on_clusters()
+    print("OK")
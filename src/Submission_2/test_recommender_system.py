@@ -0,0 +1,69 @@
+"""
+test_recommender_system.py - RecommenderSystem on degenerate vector stores
+
+Run with:  python -m pytest test_recommender_system.py   or
+           python test_recommender_system.py
+
+An empty store and a store whose entries have no image embeddings (dim 0)
+must give empty galleries with every engine, not crash while building the
+normalized matrix or the index.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "Submission_1"))
+
+# Gallery imports cfg.py, which exits if ROOT_DIR (../generated_images) does
+# not exist: import it from a temporary directory where it does
+with tempfile.TemporaryDirectory() as _tmp:
+    os.makedirs(os.path.join(_tmp, "generated_images"))
+    os.makedirs(os.path.join(_tmp, "run"))
+    _cwd = os.getcwd()
+    os.chdir(os.path.join(_tmp, "run"))
+    try:
+        import cfg  # noqa: F401
+    finally:
+        os.chdir(_cwd)
+
+from RecommenderSystem import RecommenderSystem
+
+ENGINES = [None, "ivf", "hnsw", "lsh", "pq"]
+
+
+def _system(directory: str, vectors: dict) -> RecommenderSystem:
+    path = os.path.join(directory, "vectors.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(vectors, f)
+    return RecommenderSystem(path)
+
+
+def _check_empty_results(directory: str, vectors: dict) -> None:
+    for engine in ENGINES:
+        system = _system(directory, vectors)
+        system.preprocess(engine)
+        assert system.find_similar_images("a", 3).images == [], engine
+        galleries = system.find_similar_images_batch(["a", "unknown"], 3)
+        assert [g.images for g in galleries] == [[], []], engine
+
+
+def test_empty_store(tmp_path):
+    _check_empty_results(str(tmp_path), {})
+
+
+def test_store_without_embeddings(tmp_path):
+    _check_empty_results(str(tmp_path), {
+        "a": {"image_embedding": [], "text_embedding": []},
+        "b": {"image_embedding": []},
+    })
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        test_empty_store(directory)
+        test_store_without_embeddings(directory)
+    print("OK")
@@ -0,0 +1,135 @@
+"""
+test_vector_store.py - VectorStore: streaming JSON parser and binary round trip
+
+Run with:  python -m pytest test_vector_store.py   or   python test_vector_store.py
+
+The JSON file is parsed with windows much smaller than a value (a few
+characters), so numbers, strings and keys are split across refills; the
+result must be the same as json.load(). The binary store must give back the
+same uuids and float32 rows through the memory mapping.
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from VectorStore import VectorStore
+
+
+def _vectors(count: int = 40, image_dim: int = 8, text_dim: int = 4,
+             seed: int = 1) -> dict:
+    rnd = random.Random(seed)
+    vectors = {}
+    for i in range(count):
+        entry = {"image_embedding": [rnd.uniform(-1, 1)
+                                     for _ in range(image_dim)]}
+        if i % 5:
+            entry["text_embedding"] = [rnd.gauss(0, 1e-3)
+                                       for _ in range(text_dim)]
+        vectors[f"uuid-{i}-è"] = entry
+    return vectors
+
+
+def _expected(vectors: dict, text_dim: int = 4) -> tuple:
+    image = array("f")
+    text = array("f")
+    for entry in vectors.values():
+        image.extend(entry["image_embedding"])
+        text.extend(entry.get("text_embedding") or [0.0] * text_dim)
+    return list(vectors), image, text
+
+
+def _write_json(directory: str, data, indent=None) -> str:
+    path = os.path.join(directory, "vectors.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    return path
+
+
+def _check(store: VectorStore, vectors: dict) -> None:
+    uuids, image, text = _expected(vectors)
+    assert store.uuids == uuids
+    assert store.image_dim == 8 and store.text_dim == 4
+    assert array("f", store.image) == image
+    assert array("f", store.text) == text
+    for row, uuid in enumerate(uuids):
+        assert store.row(uuid) == row
+        assert list(store.image_embedding(uuid)) == \
+            image[row * 8:(row + 1) * 8].tolist()
+    assert store.row("unknown") is None and "unknown" not in store
+
+
+def test_json_streaming(tmp_path):
+    vectors = _vectors()
+    for data, indent in ((vectors, None), (vectors, 2),
+                         ({"vectors": vectors}, None),
+                         ({"meta": {"x": [1, 2]}, "vectors": vectors}, 1)):
+        path = _write_json(str(tmp_path), data, indent)
+        for chunk_size in (1, 7, 64, 1 << 20):
+            _check(VectorStore.from_json(path, chunk_size), vectors)
+        _check(VectorStore.load(path), vectors)
+
+
+def test_json_errors(tmp_path):
+    path = os.path.join(str(tmp_path), "bad.json")
+    for text in ('{"a": {"image_embedding": [1, 2]', '[1, 2]',
+                 '{"a": {"image_embedding": [1, 2]} "b": 1}',
+                 '{"a": {"image_embedding": [1, 2]}, '
+                 '"b": {"image_embedding": [1]}}'):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        try:
+            VectorStore.from_json(path, chunk_size=3)
+        except ValueError:
+            continue
+        raise AssertionError(f"invalid file accepted: {text}")
+
+
+def test_binary_round_trip(tmp_path):
+    vectors = _vectors()
+    path = os.path.join(str(tmp_path), "vectors.bin")
+    VectorStore.from_items(vectors.items()).save(path)
+    store = VectorStore.load(path)
+    assert store.mapped
+    _check(store, vectors)
+
+    # add() copies the mapped matrices into memory
+    row = store.add("new", [0.5] * 8, [0.25] * 4)
+    assert not store.mapped and row == len(vectors)
+    assert list(store.image_embedding("new")) == [0.5] * 8
+    assert list(store.text_embedding("new")) == [0.25] * 4
+    store.close()
+
+    empty = os.path.join(str(tmp_path), "empty.bin")
+    VectorStore([], array("f"), array("f"), 8, 4).save(empty)
+    store = VectorStore.open_binary(empty)
+    assert len(store) == 0 and store.image_dim == 8 and store.text_dim == 4
+    store.close()
+
+
+def test_binary_corrupted(tmp_path):
+    path = os.path.join(str(tmp_path), "vectors.bin")
+    VectorStore.from_items(_vectors().items()).save(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    for broken in (b"NOTAVEC1" + data[8:], data[:-4]):
+        with open(path, "wb") as f:
+            f.write(broken)
+        try:
+            VectorStore.open_binary(path)
+        except ValueError:
+            continue
+        raise AssertionError("corrupted store accepted")
+
+
+if __name__ == "__main__":
+    for test in (test_json_streaming, test_json_errors,
+                 test_binary_round_trip, test_binary_corrupted):
+        with tempfile.TemporaryDirectory() as directory:
+            test(directory)
+    print("OK")